@@ -0,0 +1,159 @@
+# analytics.py
+
+# Vectorized analytics over the expenses table. Rows are loaded once into
+# columnar NumPy arrays (dates as int32 day numbers since 1970-01-01, categories
+# as uint8 codes, amounts as int64 cents) and every aggregation is done with
+# array operations instead of Python loops over tuples.
+#
+# Requires NumPy (pip install numpy).
+#
+#   from analytics import ExpenseFrame
+#   frame = ExpenseFrame.from_db(db)
+#   frame.monthly_totals()
+#
+# A binary snapshot written by utils.export_to_snapshot can be loaded instead with
+# ExpenseFrame.from_snapshot: the file is memory-mapped and the arrays point into
+# it, so nothing is parsed or copied.
+
+import mmap
+import numpy as np
+from utils import read_snapshot_header
+
+class ExpenseFrame:
+    def __init__(self, days, categories, cents, category_names):
+        self.days = days
+        self.categories = categories
+        self.cents = cents
+        self.category_names = category_names
+
+    @classmethod
+    def from_db(cls, db):
+        """Load every expense of the main database into columnar arrays (archived years are left out: use from_snapshot on a full export to include them)."""
+        count = db.count_expenses()
+        days = np.empty(count, dtype=np.int32)
+        categories = np.empty(count, dtype=np.uint8)
+        cents = np.empty(count, dtype=np.int64)
+
+        # Category ids are remapped to dense codes so they fit in a uint8.
+        category_rows = db.get_categories()
+        if len(category_rows) > 256:
+            raise ValueError("analytics supports at most 256 categories")
+        code_of_id = np.zeros(max((row[0] for row in category_rows), default=0) + 1, dtype=np.uint8)
+        for code, (category_id, _) in enumerate(category_rows):
+            code_of_id[category_id] = code
+        names = [name for _, name in category_rows]
+
+        filled = 0
+        for chunk in db.iter_column_chunks():
+            block = np.array(chunk, dtype=np.int64)
+            end = filled + len(block)
+            if end > count:
+                # Rows were added while loading: grow the arrays.
+                days = np.resize(days, end)
+                categories = np.resize(categories, end)
+                cents = np.resize(cents, end)
+            days[filled:end] = block[:, 0]
+            categories[filled:end] = code_of_id[block[:, 1]]
+            cents[filled:end] = block[:, 2]
+            filled = end
+
+        return cls(days[:filled], categories[:filled], cents[:filled], names)
+
+    @classmethod
+    def from_snapshot(cls, filename):
+        """Memory-map a snapshot written by utils.export_to_snapshot. The arrays are read-only views of the file."""
+        with open(filename, mode="rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        count, names, columns = read_snapshot_header(buffer)
+        arrays = {
+            name: np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+            for name, (offset, dtype) in columns.items()
+        }
+        return cls(arrays["days"], arrays["categories"], arrays["cents"], names)
+
+    def __len__(self):
+        return len(self.cents)
+
+    def nbytes(self):
+        """Return the memory used by the arrays."""
+        return self.days.nbytes + self.categories.nbytes + self.cents.nbytes
+
+    def totals_by_category(self):
+        """Return {category: (total, count, average)}."""
+        size = len(self.category_names)
+        totals = np.bincount(self.categories, weights=self.cents, minlength=size)
+        counts = np.bincount(self.categories, minlength=size)
+        return {
+            name: (float(totals[code]) / 100, int(counts[code]), float(totals[code]) / int(counts[code]) / 100)
+            for code, name in enumerate(self.category_names)
+            if counts[code]
+        }
+
+    def _totals_by_bucket(self, buckets):
+        """Sum the amounts per bucket number. Returns (bucket numbers, totals, counts)."""
+        if not len(buckets):
+            return buckets, np.zeros(0), np.zeros(0, dtype=np.int64)
+        unique, inverse = np.unique(buckets, return_inverse=True)
+        totals = np.bincount(inverse, weights=self.cents) / 100
+        counts = np.bincount(inverse)
+        return unique, totals, counts
+
+    def monthly_totals(self):
+        """Return a list of (YYYY-MM, total, count)."""
+        months = self.days.astype("datetime64[D]").astype("datetime64[M]")
+        unique, totals, counts = self._totals_by_bucket(months.astype(np.int64))
+        labels = unique.astype("datetime64[M]").astype(str)
+        return list(zip(labels.tolist(), totals.tolist(), counts.tolist()))
+
+    def weekly_totals(self):
+        """Return a list of (week start date YYYY-MM-DD, total, count). Weeks start on Monday."""
+        # Day 0 (1970-01-01) is a Thursday, so shifting by 3 aligns weeks on Mondays.
+        weeks = (self.days.astype(np.int64) + 3) // 7
+        unique, totals, counts = self._totals_by_bucket(weeks)
+        labels = (unique * 7 - 3).astype("datetime64[D]").astype(str)
+        return list(zip(labels.tolist(), totals.tolist(), counts.tolist()))
+
+    def daily_totals(self):
+        """Return (first day as datetime64, array of totals for every day up to the last one)."""
+        if not len(self.days):
+            return None, np.zeros(0)
+        first = int(self.days.min())
+        totals = np.bincount(self.days - first, weights=self.cents) / 100
+        return np.datetime64(first, "D"), totals
+
+    def rolling_average(self, window=7):
+        """Return (first day, rolling mean of the daily totals over `window` days, including empty days)."""
+        first, totals = self.daily_totals()
+        if len(totals) < window:
+            return first, np.zeros(0)
+        cumulative = np.cumsum(np.concatenate(([0.0], totals)))
+        return first + np.timedelta64(window - 1, "D"), (cumulative[window:] - cumulative[:-window]) / window
+
+    def percentiles(self, quantiles=(50, 90, 95, 99)):
+        """Return {quantile: amount} over all expenses."""
+        if not len(self.cents):
+            return {}
+        values = np.percentile(self.cents, quantiles) / 100
+        return dict(zip(quantiles, values.tolist()))
+
+    def category_distributions(self, quantiles=(25, 50, 75, 90)):
+        """Return {category: {"count", "mean", "min", "max", and each quantile}} for every category."""
+        order = np.lexsort((self.cents, self.categories))
+        sorted_categories = self.categories[order]
+        sorted_cents = self.cents[order]
+        boundaries = np.flatnonzero(np.diff(sorted_categories)) + 1
+
+        distributions = {}
+        for group in np.split(np.arange(len(sorted_cents)), boundaries):
+            if not len(group):
+                continue
+            values = sorted_cents[group]
+            stats = {
+                "count": int(len(values)),
+                "mean": float(values.mean()) / 100,
+                "min": int(values[0]) / 100,
+                "max": int(values[-1]) / 100,
+            }
+            stats.update({f"p{q}": value for q, value in zip(quantiles, (np.percentile(values, quantiles) / 100).tolist())})
+            distributions[self.category_names[sorted_categories[group[0]]]] = stats
+        return distributions
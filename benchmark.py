@@ -0,0 +1,165 @@
+# benchmark.py
+
+# Reproducible benchmark suite for db.py and utils.py. A deterministic synthetic
+# dataset is generated from a seed, every operation is timed, and the results are
+# written to JSON and optionally compared against a stored baseline.
+#
+#   python benchmark.py --size 10k --output results.json
+#   python benchmark.py --size 1m --baseline results.json --tolerance 0.2
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from config import CATEGORIES
+from db import ExpenseDB
+from utils import export_to_csv
+
+# Differences smaller than this are timer noise and never flagged as regressions.
+MIN_REGRESSION_SECONDS = 0.001
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# Relative category frequencies: a few categories get most of the expenses.
+CATEGORY_WEIGHTS = [1 / (rank + 1) ** 1.2 for rank in range(len(CATEGORIES))]
+
+def generate_expenses(count, seed=42, start=date(2020, 1, 1), days=5 * 365):
+    """Yield `count` deterministic (date, category, amount, note) tuples.
+
+    Dates are spread over `days` days with more spending near the start of each month,
+    categories follow CATEGORY_WEIGHTS and amounts are log-normal.
+    """
+    rng = random.Random(seed)
+    dates = [(start + timedelta(days=offset)).isoformat() for offset in range(days)]
+    day_weights = [2.0 if (start + timedelta(days=offset)).day <= 5 else 1.0 for offset in range(days)]
+    chunk = 10_000
+    for produced in range(0, count, chunk):
+        size = min(chunk, count - produced)
+        picked_dates = rng.choices(dates, day_weights, k=size)
+        picked_categories = rng.choices(CATEGORIES, CATEGORY_WEIGHTS, k=size)
+        for i in range(size):
+            amount = round(min(rng.lognormvariate(3, 1), 100_000), 2)
+            yield (picked_dates[i], picked_categories[i], amount, f"note {produced + i}")
+
+def timed(function, repeat):
+    """Run `function` `repeat` times and return (median seconds, last result)."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+def run(size_name, seed, repeat, directory):
+    """Build the dataset and time every operation. Returns the results dict."""
+    rows = SIZES[size_name]
+    path = os.path.join(directory, f"bench_{size_name}.db")
+    results = {}
+
+    # Progress and per-row messages from the code under test are not part of the benchmark.
+    with contextlib.redirect_stdout(io.StringIO()):
+        # The result cache would turn every repeat after the first into a cache hit.
+        db = ExpenseDB(path, cache=False)
+        started = time.perf_counter()
+        db.add_expenses_many(generate_expenses(rows, seed))
+        results["insert_many"] = time.perf_counter() - started
+
+        category = CATEGORIES[0]
+        start, end = "2021-03-01", "2021-05-31"
+        cases = {
+            "get_expenses": lambda: db.get_expenses(),
+            "get_expenses_ordered": lambda: db.get_expenses(order_by_amount="desc"),
+            "get_expenses_by_category": lambda: db.get_expenses_by_category(category),
+            "get_expenses_by_category_ordered": lambda: db.get_expenses_by_category(category, order_by_amount="desc"),
+            "get_expenses_between_dates": lambda: db.get_expenses_between_dates(start, end),
+            "get_expenses_between_dates_ordered": lambda: db.get_expenses_between_dates(start, end, order_by_amount="desc"),
+            "query_expenses_top10": lambda: db.query_expenses(order_by="-amount", limit=10),
+            "query_expenses_combined": lambda: db.query_expenses(category, start, end, 10, 100, "-amount"),
+            "get_report_category": lambda: db.get_report_category(),
+            "get_report_by_date_range": lambda: db.get_report_by_date_range(start, end),
+            "export_to_csv": lambda: export_to_csv(db.iter_expenses(), os.path.join(directory, "bench.csv")),
+        }
+        for name, case in cases.items():
+            # Full-table listings are only timed once on the large datasets.
+            case_repeat = 1 if rows > 1_000_000 and name.startswith(("get_expenses", "export")) else repeat
+            results[name] = timed(case, case_repeat)[0]
+
+        db.add_expense("2021-04-01", category, 10.0, "single insert")
+        results["add_expense"] = timed(lambda: db.add_expense("2021-04-01", category, 10.0, "single insert"), repeat)[0]
+        db.close()
+
+    return {
+        "size": size_name,
+        "rows": rows,
+        "seed": seed,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": {name: round(seconds, 6) for name, seconds in results.items()},
+    }
+
+def compare(current, baseline, tolerance):
+    """Print current vs baseline times. Returns the names that regressed by more than `tolerance`."""
+    regressions = []
+    print(f"\n{'Operation':<38} {'Baseline s':>11} {'Current s':>11} {'Change':>8}")
+    print("-" * 71)
+    for name, seconds in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<38} {'-':>11} {seconds:>11.4f} {'new':>8}")
+            continue
+        change = (seconds - before) / before if before else 0.0
+        flag = ""
+        if change > tolerance and seconds - before > MIN_REGRESSION_SECONDS:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<38} {before:>11.4f} {seconds:>11.4f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ExpenseDB and the CSV export on synthetic data.")
+    parser.add_argument("--size", choices=SIZES, default="10k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per operation (the median is kept).")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="JSON results to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%).")
+    parser.add_argument("--workdir", help="Directory for the benchmark database (default: a temporary one).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as directory:
+        current = run(args.size, args.seed, args.repeat, directory)
+
+    with open(args.output, mode="w", encoding="utf-8") as file:
+        json.dump(current, file, indent=2)
+    print(f"Results for {current['rows']} rows saved to {args.output}")
+
+    if not args.baseline:
+        for name, seconds in current["results"].items():
+            print(f"{name:<38} {seconds:>11.4f} s")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline.get("size") != current["size"] or baseline.get("seed") != current["seed"]:
+        print("Baseline was recorded with a different size or seed; the comparison is not meaningful.")
+        return 2
+
+    regressions = compare(current, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
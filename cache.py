@@ -0,0 +1,90 @@
+# cache.py
+
+# LRU cache for ExpenseDB query results, bounded by an estimate of the memory the
+# cached rows use. Entries are tagged with a version token; when the token changes
+# (a write through ExpenseDB or a commit from another connection) the whole cache
+# is dropped.
+
+import sys
+import threading
+from collections import OrderedDict
+
+def estimate_size(result):
+    """Estimate the memory used by a query result (a list of row tuples or a single row)."""
+    if isinstance(result, list):
+        if not result:
+            return sys.getsizeof(result)
+        first = result[0]
+        row_size = sys.getsizeof(first)
+        if isinstance(first, tuple):
+            row_size += sum(sys.getsizeof(value) for value in first)
+        return sys.getsizeof(result) + row_size * len(result)
+    if isinstance(result, tuple):
+        return sys.getsizeof(result) + sum(sys.getsizeof(value) for value in result)
+    return sys.getsizeof(result)
+
+class ResultCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.token = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def check_token(self, token):
+        """Drop every entry if the data changed since they were stored."""
+        with self.lock:
+            if token != self.token:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.bytes = 0
+                self.token = token
+
+    def get(self, key):
+        """Return (True, result) on a hit, or (False, None) on a miss."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, token, result):
+        """Store a result computed under `token`, evicting the least recently used entries."""
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if token != self.token:
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (result, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        """Return the hit/miss statistics."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
@@ -13,3 +13,96 @@ CATEGORIES = [
     "Gas",
     "Others"
 ]
+
+# Number of rows inserted per transaction by the bulk insert API.
+
+BATCH_SIZE = 5000
+
+# Number of rows between progress messages during a CSV import.
+
+PROGRESS_EVERY = 100000
+
+# Number of rows fetched per round-trip by the iterator read methods.
+
+FETCH_SIZE = 1000
+
+# Number of expenses shown per page when browsing.
+
+PAGE_SIZE = 20
+
+# SQLite settings applied to every ExpenseDB connection. auto_vacuum must come
+# first: it only takes effect on a new database before journal_mode is set.
+
+SQLITE_PRAGMAS = {
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "mmap_size": 268435456,
+    "busy_timeout": 5000,
+}
+
+# Number of read connections opened by ExpenseDB in pooled mode.
+
+POOL_SIZE = 4
+
+# Local JSON service (service.py): address, database worker threads and
+# maximum number of requests handled at the same time.
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_WORKERS = 4
+SERVICE_MAX_REQUESTS = 32
+
+# Maximum number of /expenses listings streamed at the same time. Each stream keeps a
+# read connection until it ends, so the service opens this many connections on top of
+# one per worker thread.
+
+SERVICE_MAX_STREAMS = 8
+
+# Logging: file, level (overridden by the EXPENSE_TRACKER_LOG_LEVEL environment
+# variable), size-based rotation, and sampling of repetitive events (1 logs
+# every event, N logs one of every N).
+
+LOG_FILE = "tracker.log"
+LOG_LEVEL = "INFO"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+LOG_SAMPLE_EVERY = 1
+
+# Performance metrics for ExpenseDB (also enabled by EXPENSE_TRACKER_METRICS=1).
+# Queries slower than SLOW_QUERY_MS are logged with their query plan.
+
+METRICS_ENABLED = False
+SLOW_QUERY_MS = 100
+
+# Query result cache in ExpenseDB, bounded by an estimate of its memory use.
+
+CACHE_ENABLED = True
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Partitioned export: threads writing (and optionally compressing) the
+# partition files, and chunks of FETCH_SIZE rows buffered per writer.
+
+EXPORT_WORKERS = 4
+EXPORT_QUEUE_CHUNKS = 8
+
+# Archives of closed years: file name next to the main database ({stem} is the
+# main file name without extension), and the most archive files attached to one
+# connection at a time (SQLite allows 10 attached databases by default).
+
+ARCHIVE_FILENAME = "{stem}_{year}.db"
+ARCHIVE_MAX_ATTACHED = 8
+
+# Online backup: pages copied per step and pause between steps (seconds), so
+# reads and writes keep running during a backup.
+
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.005
+
+# Maintenance: free pages reclaimed per incremental vacuum step, time budget of
+# one maintenance run (seconds), and how often the service runs it (seconds).
+
+VACUUM_STEP_PAGES = 256
+MAINTENANCE_MAX_SECONDS = 1.0
+MAINTENANCE_INTERVAL = 3600
@@ -1,17 +1,514 @@
 # db.py
 
+import functools
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import queue
+import re
 import sqlite3
-from logger import logger 
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date as Date
+from config import CATEGORIES, BATCH_SIZE, FETCH_SIZE, PAGE_SIZE, SQLITE_PRAGMAS, POOL_SIZE, METRICS_ENABLED
+from config import CACHE_ENABLED, CACHE_MAX_BYTES, ARCHIVE_FILENAME, ARCHIVE_MAX_ATTACHED
+from config import BACKUP_PAGES, BACKUP_SLEEP, VACUUM_STEP_PAGES, MAINTENANCE_MAX_SECONDS
+from cache import ResultCache
+from logger import logger, log_sampled
+
+# Rollup tables kept up to date by triggers: table name -> (grouping column, column type).
+ROLLUPS = {
+    "daily_rollup": ("date", "TEXT"),
+    "category_rollup": ("category_id", "INTEGER"),
+}
+
+# Rollup layout of schema version 5, before amounts were stored in cents.
+LEGACY_ROLLUPS = {
+    "daily_rollup": ("date", "TEXT"),
+    "category_rollup": ("category", "TEXT"),
+}
+
+# Expense rows are always returned as (id, date, category name, amount, note).
+EXPENSE_COLUMNS = "e.id, e.date, c.name, e.amount_cents / 100.0, e.note"
+EXPENSE_TABLES = "expenses AS e JOIN categories AS c ON c.id = e.category_id"
+SELECT_EXPENSES = f"SELECT {EXPENSE_COLUMNS} FROM {EXPENSE_TABLES}"
+
+def _rollup_statements(table, column, column_type, amount, amount_type):
+    """Return the CREATE statements for a rollup table and the triggers that maintain it."""
+    add = f"""
+        INSERT INTO {table} ({column}, total, count, min_amount, max_amount)
+        VALUES (NEW.{column}, NEW.{amount}, 1, NEW.{amount}, NEW.{amount})
+        ON CONFLICT ({column}) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + 1,
+            min_amount = MIN(min_amount, excluded.min_amount),
+            max_amount = MAX(max_amount, excluded.max_amount);
+    """
+    # The row of the last expense of a key is deleted first, so min and max are never recomputed
+    # over an empty set. Otherwise they are only recomputed (through the indexes) when the removed
+    # amount was one of them.
+    remove = f"""
+        DELETE FROM {table} WHERE {column} = OLD.{column} AND count <= 1;
+        UPDATE {table} SET
+            total = total - OLD.{amount},
+            count = count - 1,
+            min_amount = CASE WHEN OLD.{amount} > min_amount THEN min_amount
+                ELSE (SELECT MIN({amount}) FROM expenses WHERE {column} = OLD.{column}) END,
+            max_amount = CASE WHEN OLD.{amount} < max_amount THEN max_amount
+                ELSE (SELECT MAX({amount}) FROM expenses WHERE {column} = OLD.{column}) END
+        WHERE {column} = OLD.{column};
+    """
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            {column} {column_type} PRIMARY KEY,
+            total {amount_type} NOT NULL,
+            count INTEGER NOT NULL,
+            min_amount {amount_type} NOT NULL,
+            max_amount {amount_type} NOT NULL
+        ) WITHOUT ROWID
+        """,
+        f"CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON expenses BEGIN {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON expenses BEGIN {remove} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF date, {column}, {amount} ON expenses "
+        f"BEGIN {remove} {add} END",
+    ]
+
+def _fill_rollup(conn, table, column, amount="amount_cents", keys=None):
+    """Recompute a rollup table from the expenses table, or only the rows of the given keys."""
+    select = f"""
+        INSERT INTO {table} ({column}, total, count, min_amount, max_amount)
+        SELECT {column}, SUM({amount}), COUNT(*), MIN({amount}), MAX({amount})
+        FROM expenses
+    """
+    if keys is None:
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"{select} GROUP BY {column}")
+        return
+    keys = [(key,) for key in keys]
+    conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", keys)
+    conn.executemany(f"{select} WHERE {column} = ? GROUP BY {column}", keys)
+
+def _add_to_rollup(conn, table, column, after_id):
+    """Add the expenses with an id above `after_id` to a rollup table, one upsert per key."""
+    conn.execute(f"""
+        INSERT INTO {table} ({column}, total, count, min_amount, max_amount)
+        SELECT {column}, SUM(amount_cents), COUNT(*), MIN(amount_cents), MAX(amount_cents)
+        FROM expenses
+        WHERE id > ?
+        GROUP BY {column}
+        ON CONFLICT ({column}) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + excluded.count,
+            min_amount = MIN(min_amount, excluded.min_amount),
+            max_amount = MAX(max_amount, excluded.max_amount)
+    """, (after_id,))
+
+def _create_rollups(conn, rollups, amount, amount_type):
+    """Create the rollup tables and triggers, and fill them from the existing expenses."""
+    for table, (column, column_type) in rollups.items():
+        for statement in _rollup_statements(table, column, column_type, amount, amount_type):
+            conn.execute(statement)
+        _fill_rollup(conn, table, column, amount)
+
+def _create_legacy_rollups(conn):
+    """Migration: add the rollup tables over the REAL amount and TEXT category columns."""
+    _create_rollups(conn, LEGACY_ROLLUPS, "amount", "REAL")
+
+def _store_cents_and_category_ids(conn):
+    """Migration: store amounts as INTEGER cents and categories as ids of a categories table."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.executemany("INSERT OR IGNORE INTO categories (name) VALUES (?)", [(name,) for name in CATEGORIES])
+    conn.execute("INSERT OR IGNORE INTO categories (name) SELECT DISTINCT category FROM expenses")
+    
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'").fetchone()
+    for table in LEGACY_ROLLUPS:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    
+    conn.execute("""
+        CREATE TABLE expenses_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            category_id INTEGER NOT NULL REFERENCES categories (id),
+            amount_cents INTEGER NOT NULL,
+            note TEXT
+        )
+    """)
+    conn.execute("""
+        INSERT INTO expenses_new (id, date, category_id, amount_cents, note)
+        SELECT e.id, e.date, c.id, CAST(ROUND(e.amount * 100) AS INTEGER), e.note
+        FROM expenses AS e JOIN categories AS c ON c.name = e.category
+    """)
+    # Dropping the old table also drops its indexes and rollup triggers.
+    conn.execute("DROP TABLE expenses")
+    conn.execute("ALTER TABLE expenses_new RENAME TO expenses")
+    if sequence is not None:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses'", sequence)
+    
+    conn.execute("CREATE INDEX idx_expenses_date_amount ON expenses (date, amount_cents)")
+    conn.execute("CREATE INDEX idx_expenses_category_date_amount ON expenses (category_id, date, amount_cents)")
+    conn.execute("CREATE INDEX idx_expenses_amount ON expenses (amount_cents)")
+    conn.execute("CREATE INDEX idx_expenses_date ON expenses (date)")
+    _create_rollups(conn, ROLLUPS, "amount_cents", "INTEGER")
+
+# Trigger adding each new expense to the note index. Bulk inserts drop it and index the whole
+# batch with one statement instead.
+NOTE_SEARCH_INSERT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts (rowid, note) VALUES (NEW.id, NEW.note);
+    END
+"""
+
+def _create_note_search(conn):
+    """Migration: add an FTS5 index over the notes, kept in sync by triggers."""
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+            note,
+            content='expenses',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+    conn.execute(NOTE_SEARCH_INSERT_TRIGGER)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, note) VALUES ('delete', OLD.id, OLD.note);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF note ON expenses BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, note) VALUES ('delete', OLD.id, OLD.note);
+            INSERT INTO expenses_fts (rowid, note) VALUES (NEW.id, NEW.note);
+        END
+    """)
+    conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+def _drop_rollup_triggers(conn):
+    """Drop the triggers that maintain the rollup tables."""
+    for table in ROLLUPS:
+        for trigger in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_{trigger}")
+
+def _create_rollup_triggers(conn):
+    """Create the triggers that maintain the rollup tables."""
+    for table, (column, column_type) in ROLLUPS.items():
+        for statement in _rollup_statements(table, column, column_type, "amount_cents", "INTEGER")[1:]:
+            conn.execute(statement)
+
+def _create_archive_registry(conn):
+    """Migration: add the list of archived years and their category totals."""
+    conn.execute("""
+        CREATE TABLE archives (
+            year INTEGER PRIMARY KEY,
+            filename TEXT NOT NULL,
+            count INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE archive_category_rollup (
+            year INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (year, category_id)
+        ) WITHOUT ROWID
+    """)
+
+def _content_hash(date, category_id, amount_cents, note):
+    """Return the 64-bit hash identifying an expense by its content (the note compared without case or extra spaces)."""
+    normalized = " ".join((note or "").lower().split())
+    digest = hashlib.blake2b(f"{date}|{category_id}|{amount_cents}|{normalized}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def _refresh_content_hashes(conn, ids):
+    """Recompute content_hash and original for expenses that may have changed since they were hashed.
+    
+    Run by ExpenseDB after every update: a trigger would need the expense_hash function, which other
+    SQLite clients do not have. When the original of a hash changes, the next expense becomes it.
+    """
+    rows = conn.execute("""
+        SELECT id, date, category_id, amount_cents, note, content_hash FROM expenses
+        WHERE id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(list(ids)),))
+    changed, hashes = [], set()
+    for expense_id, date, category_id, amount_cents, note, old_hash in rows:
+        new_hash = _content_hash(date, category_id, amount_cents, note)
+        if new_hash != old_hash:
+            changed.append((new_hash, expense_id))
+            hashes.update(content_hash for content_hash in (old_hash, new_hash) if content_hash is not None)
+    if not changed:
+        return
+    conn.executemany("UPDATE expenses SET content_hash = ?, original = NULL WHERE id = ?", changed)
+    conn.executemany("""
+        UPDATE expenses SET original = 1
+        WHERE id = (SELECT MIN(id) FROM expenses WHERE content_hash = ?1)
+          AND NOT EXISTS (SELECT 1 FROM expenses WHERE content_hash = ?1 AND original = 1)
+    """, [(content_hash,) for content_hash in hashes])
+
+# Trigger keeping original right when expenses are deleted, by any client: when the first expense
+# with a hash goes away, the next one becomes the original. Updates go through _refresh_content_hashes.
+CONTENT_TRIGGERS = [
+    """
+        CREATE TRIGGER expenses_content_delete AFTER DELETE ON expenses WHEN OLD.original = 1 BEGIN
+            UPDATE expenses SET original = 1
+            WHERE id = (SELECT MIN(id) FROM expenses WHERE content_hash = OLD.content_hash);
+        END
+    """,
+]
+
+def _add_content_hash(conn):
+    """Migration: add the content hash used to detect duplicate expenses.
+    
+    `original` is 1 on the first expense with a given hash and NULL on its copies, so the unique
+    index on (content_hash, original) lets INSERT ... ON CONFLICT skip duplicates while the
+    copies that already exist can stay. The hashes are computed with expense_hash, which is
+    registered on every ExpenseDB connection.
+    """
+    conn.execute("ALTER TABLE expenses ADD COLUMN content_hash INTEGER")
+    conn.execute("ALTER TABLE expenses ADD COLUMN original INTEGER")
+    conn.execute("UPDATE expenses SET content_hash = expense_hash(date, category_id, amount_cents, note)")
+    conn.execute("UPDATE expenses SET original = 1 WHERE id IN (SELECT MIN(id) FROM expenses GROUP BY content_hash)")
+    conn.execute("CREATE UNIQUE INDEX idx_expenses_content ON expenses (content_hash, original)")
+    for statement in CONTENT_TRIGGERS:
+        conn.execute(statement)
+
+# Schema of an archive file: a copy of the expenses of one year with the categories and
+# the daily rollup, so every archive can be read on its own.
+ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.expenses (
+        id INTEGER PRIMARY KEY,
+        date TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        note TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_expenses_date_amount ON expenses (date, amount_cents)",
+    "CREATE TABLE IF NOT EXISTS {schema}.categories (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.daily_rollup (
+        date TEXT PRIMARY KEY,
+        total INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        min_amount INTEGER NOT NULL,
+        max_amount INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+]
+
+# Schema migrations, applied in order. The position in the list (starting at 1)
+# is the schema version stored in PRAGMA user_version after it runs.
+MIGRATIONS = [
+    "CREATE INDEX IF NOT EXISTS idx_expenses_date_amount ON expenses (date, amount)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_category_date_amount ON expenses (category, date, amount)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_amount ON expenses (amount)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)",
+    _create_legacy_rollups,
+    _store_cents_and_category_ids,
+    _create_note_search,
+    _create_archive_registry,
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    _add_content_hash,
+    "DROP TRIGGER IF EXISTS expenses_content_update",
+]
+
+# Migrations that rewrite the expenses table or change auto_vacuum. The file is vacuumed afterwards
+# to release the old pages (and, for auto_vacuum, to make the setting take effect).
+VACUUM_AFTER_MIGRATIONS = {6, 9}
+
+# Content hashes that appear more than once. Grouping follows idx_expenses_content, so this is
+# one pass over the index without a sort, whatever the size of the table.
+DUPLICATE_HASHES = "SELECT content_hash FROM expenses GROUP BY content_hash HAVING COUNT(*) > 1"
+
+# What add_expenses_many does with an expense that is already stored (same date, category,
+# amount and note): insert it anyway, skip it, or keep the stored one and update its note.
+DUPLICATE_CONFLICTS = {
+    "insert": "",
+    "skip": " ON CONFLICT (content_hash, original) DO NOTHING",
+    "update": " ON CONFLICT (content_hash, original) DO UPDATE SET note = excluded.note WHERE note IS NOT excluded.note",
+}
+
+# Partitions of the partitioned export: ORDER BY clause that keeps the rows of each
+# partition together (both are served by an index, so no sort is needed).
+PARTITION_ORDERS = {
+    "category": "e.category_id, e.date",
+    "month": "e.date",
+}
+
+# Periods of the trend report: SQL expression giving the first day (or the prefix) of the
+# period a date falls in. Weeks start on Monday.
+TREND_PERIODS = {
+    "day": "{date}",
+    "week": "date({date}, '-6 days', 'weekday 1')",
+    "month": "substr({date}, 1, 7)",
+    "year": "substr({date}, 1, 4)",
+}
+
+# Date range covering every expense, used to read all the archived years.
+ALL_DATES = ("0000-01-01", "9999-12-31")
+
+# Sort keys accepted by query_expenses (prefix with "-" for descending order).
+SORT_KEYS = {
+    "id": "e.id",
+    "date": "e.date",
+    "category": "c.name",
+    "amount": "e.amount_cents",
+}
+
+# Sort keys available for keyset pagination: column name and position in a row.
+PAGE_KEYS = {
+    "id": ("e.id", 0),
+    "date": ("e.date", 1),
+    "amount": ("e.amount_cents", 3),
+}
+
+# Queries checked by check_query_plans(). They must not scan the whole table.
+QUERY_PLAN_CHECKS = {
+    "expenses_by_category": (f"{SELECT_EXPENSES} WHERE e.category_id=? ORDER BY e.amount_cents", (1,)),
+    "expenses_between_dates": (f"{SELECT_EXPENSES} WHERE e.date BETWEEN ? AND ?", ("2025-01-01", "2025-01-31")),
+    "expenses_by_amount": (f"{SELECT_EXPENSES} ORDER BY e.amount_cents DESC", ()),
+    "report_by_date_range": ("SELECT SUM(total), SUM(count) FROM daily_rollup WHERE date BETWEEN ? AND ?", ("2025-01-01", "2025-01-31")),
+    "duplicates": (DUPLICATE_HASHES, ()),
+}
+
+def cached(method):
+    """Serve a read method from the result cache, keyed by method name and arguments."""
+    name = method.__name__
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._cache is None:
+            return method(self, *args, **kwargs)
+        
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+        
+        token = self._cache_token()
+        self._cache.check_token(token)
+        hit, result = self._cache.get(key)
+        if not hit:
+            result = method(self, *args, **kwargs)
+            # Empty results are not cached: errors are reported as empty results too.
+            if result:
+                self._cache.put(key, token, result)
+        # Callers get their own list, so they can't modify the cached one.
+        return list(result) if isinstance(result, list) else result
+    return wrapper
 
 class ExpenseDB:
-    def __init__(self, DB_NAME="expenses.db"):
+    def __init__(self, DB_NAME="expenses.db", pooled=False, pool_size=POOL_SIZE, pragmas=None, instrument=None,
+                 cache=CACHE_ENABLED, cache_max_bytes=CACHE_MAX_BYTES):
+        """Open the database. In pooled mode reads use a pool of connections and writes a single serialized one.
+        
+        With instrument=True every public method and SQL statement is timed (see metrics.py).
+        With cache=True report and listing results are cached until the data changes (see cache.py).
+        """
         self.DB_NAME = DB_NAME
-        self.conn = sqlite3.connect(self.DB_NAME)
+        self.pragmas = {**SQLITE_PRAGMAS, **(pragmas or {})}
+        
+        if instrument is None:
+            instrument = METRICS_ENABLED or os.environ.get("EXPENSE_TRACKER_METRICS") == "1"
+        self._factory = sqlite3.Connection
+        if instrument:
+            from metrics import TimedConnection
+            self._factory = TimedConnection
+        
+        self._write_lock = threading.RLock()
+        self._generation = 0
+        # Last PRAGMA data_version seen, and how many times it changed because of another client.
+        self._token_lock = threading.Lock()
+        self._data_version = None
+        self._external_changes = 0
+        self._cache = ResultCache(cache_max_bytes) if cache else None
+        self.conn = self._connect()
         self.cursor = self.conn.cursor()
         self.create_table_expenses()
+        self.migrate()
+        self._load_categories()
+        
+        self._readers = None
+        if pooled:
+            self._readers = queue.Queue()
+            for _ in range(pool_size):
+                self._readers.put(self._connect())
+        
+        # data_version does not count a connection's own commits. Without a pool that is the writer;
+        # with one, a connection of its own is read and re-read after every local write instead.
+        self._version_conn = self.conn
+        if pooled and cache:
+            self._version_conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+        
+        if instrument:
+            from metrics import instrument as instrument_methods
+            instrument_methods(self, "ExpenseDB")
+    
+    def _connect(self):
+        """Open a connection with the configured pragmas."""
+        conn = sqlite3.connect(self.DB_NAME, check_same_thread=False, factory=self._factory)
+        conn.create_function("expense_hash", 4, _content_hash, deterministic=True)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+    
+    @contextmanager
+    def _reader(self):
+        """Borrow a read connection from the pool (or the main connection when not pooled)."""
+        if self._readers is None:
+            yield self.conn
+            return
+        
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
+    @contextmanager
+    def _writer(self):
+        """Hold the single writer connection. Writes from several threads are serialized."""
+        with self._write_lock:
+            yield self.conn
+    
+    def _invalidate(self):
+        """Mark cached results as stale after a write through this object."""
+        with self._write_lock:
+            self._generation += 1
+            # The write is covered by the generation, so it must not count as an external change.
+            with self._token_lock:
+                self._data_version = self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def _cache_token(self):
+        """Return the current data version: local writes plus commits made by other connections.
+        
+        data_version is read without the writer lock, so the token never waits for a write transaction.
+        """
+        with self._token_lock:
+            version = self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._data_version = version
+                self._external_changes += 1
+            return (self._generation, self._external_changes)
+    
+    def cache_stats(self):
+        """Return the result cache hit/miss statistics, or None if the cache is disabled."""
+        return self._cache.stats() if self._cache is not None else None
 
     def create_table_expenses(self):
-        """Create the expenses table if it does not exist"""
+        """Create the expenses table if it does not exist. New databases are then upgraded by migrate()."""
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS expenses (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -23,61 +520,260 @@ class ExpenseDB:
         """)
         self.conn.commit()
         
+    def schema_version(self):
+        """Return the schema version stored in PRAGMA user_version."""
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def migrate(self):
+        """Upgrade the database schema in place, applying every migration newer than the current version."""
+        version = self.schema_version()
+        # Databases from before the migrations existed are at version 0 too, so a new file is told
+        # apart by its empty expenses table: there is nothing to release in it. An empty file still
+        # needs the VACUUM if it was created without incremental auto_vacuum.
+        needs_vacuum = (self.conn.execute("SELECT EXISTS (SELECT 1 FROM expenses)").fetchone()[0]
+                        or self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2)
+        
+        for target in range(version + 1, len(MIGRATIONS) + 1):
+            migration = MIGRATIONS[target - 1]
+            try:
+                self.conn.execute("BEGIN")
+                if callable(migration):
+                    migration(self.conn)
+                else:
+                    self.conn.execute(migration)
+                self.conn.execute(f"PRAGMA user_version = {target}")
+                self.conn.commit()
+                logger.info("Database migrated to schema version %s", target)
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error migrating the database to version {target}: {e}")
+                logger.error("Error in migrate. Version=%s: %s", target, e)
+                raise
+        
+        if VACUUM_AFTER_MIGRATIONS & set(range(version + 1, len(MIGRATIONS) + 1)) and needs_vacuum:
+            self.conn.execute("VACUUM")
+            logger.info("Database vacuumed after migration")
+    
+    def _load_categories(self):
+        """Load the category name -> id mapping used to store expenses."""
+        self._category_ids = dict(self.conn.execute("SELECT name, id FROM categories"))
+    
+    def _category_id(self, name, create=True, transaction=None):
+        """Return the id of a category, adding it to the categories table if needed.
+        
+        A new category is committed straight away, so a cached id always belongs to a stored row
+        even if the caller's own write rolls back later. Given the connection of an open
+        transaction, the category is added inside it instead and its id is not cached.
+        """
+        category_id = self._category_ids.get(name)
+        if category_id is None and transaction is not None:
+            if create:
+                transaction.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (name,))
+            row = transaction.execute("SELECT id FROM categories WHERE name = ?", (name,)).fetchone()
+            return row[0] if row is not None else None
+        if category_id is None:
+            with self._writer() as conn:
+                if create:
+                    conn.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (name,))
+                    conn.commit()
+                row = conn.execute("SELECT id FROM categories WHERE name = ?", (name,)).fetchone()
+            if row is not None:
+                category_id = self._category_ids[name] = row[0]
+        return category_id
+    
+    def check_query_plans(self):
+        """Run EXPLAIN QUERY PLAN on the main read queries. Returns {name: (plan, full_scan)}."""
+        results = {}
+        for name, (sql, parameters) in QUERY_PLAN_CHECKS.items():
+            with self._reader() as conn:
+                rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+            plan = [row[3] for row in rows]
+            full_scan = any(step in ("SCAN e", "SCAN expenses", "SCAN daily_rollup") for step in plan)
+            results[name] = (plan, full_scan)
+            
+            status = "FULL SCAN" if full_scan else "ok"
+            print(f"{name:<25} {status:<10} {' | '.join(plan)}")
+        return results
+    
     def add_expense(self, date, category, amount, note=""):
-        """Add a new expense in the expenses table"""
+        """Add a new expense in the expenses table. Returns its id, or None if it was not added."""
+        if not math.isfinite(amount):
+            print("The amount must be a number")
+            logger.error("Attempt to enter a non-finite amount: %s", amount)
+            return
         if amount < 0:
             print("A negative amount is not valid")
-            logger.error(f"Attempt to enter a negative amount: {amount}")
+            logger.error("Attempt to enter a negative amount: %s", amount)
             return
         
         try:
-            self.cursor.execute("""
-                INSERT INTO expenses (date, category, amount, note)
-                VALUES (?, ?, ?, ?)
-            """, (date, category, amount, note))
-            self.conn.commit()
+            category_id = self._category_id(category)
+            amount_cents = round(amount * 100)
+            content_hash = _content_hash(date, category_id, amount_cents, note)
+            with self._writer() as conn:
+                cursor = conn.execute("""
+                    INSERT INTO expenses (date, category_id, amount_cents, note, content_hash, original)
+                    VALUES (?1, ?2, ?3, ?4, ?5, CASE WHEN EXISTS (
+                        SELECT 1 FROM expenses WHERE content_hash = ?5 AND original = 1
+                    ) THEN NULL ELSE 1 END)
+                """, (date, category_id, amount_cents, note, content_hash))
+                conn.commit()
+            self._invalidate()
             print(f"Expense added in category {category} - {amount:.2f}")
-            logger.info(f"Expense added: Date={date}, Category={category}, Amount={amount}, Note={note}")
+            log_sampled(logging.INFO, "Expense added: Date=%s, Category=%s, Amount=%s, Note=%s", date, category, amount, note)
+            return cursor.lastrowid
         except Exception as e:
             print("Error adding a new expense:", e)
-            logger.error(f"Error in add_expense: {e}")
+            logger.error("Error in add_expense: %s", e)
     
-    def get_expenses(self, order_by_amount=None):
-        """Returns all the expenses from the database. Data can optionally be ordered by amount (ASC or DESC)."""
+    def add_expenses_many(self, expenses, batch_size=BATCH_SIZE, on_duplicate="insert"):
+        """Add many expenses in batched transactions. Returns a summary with the inserted, duplicate and rejected counts.
+        
+        If a batch fails the run stops and the summary's "error" holds the message (None when everything was added).
+        
+        on_duplicate decides what happens to an expense with the same date, category, amount and note
+        as one already stored or earlier in the input: "insert" adds it anyway, "skip" leaves it out
+        and "update" keeps the stored expense and gives it the new note (which may differ in case
+        or spacing).
+        """
+        if on_duplicate not in DUPLICATE_CONFLICTS:
+            raise ValueError(f"Unknown duplicate mode: {on_duplicate}")
+        
+        inserted = 0
+        duplicates = 0
+        rejected = 0
+        error = None
+        batch = []
+        
         try:
-            if order_by_amount == "asc":
-                self.cursor.execute("SELECT * FROM expenses ORDER BY amount ASC")
-            elif order_by_amount == "desc":
-                self.cursor.execute("SELECT * FROM expenses ORDER BY amount DESC")
-            else:
-                self.cursor.execute("SELECT * FROM expenses")
-            return self.cursor.fetchall()
+            for row in expenses:
+                expense = self._validate_expense(row)
+                if expense is None:
+                    rejected += 1
+                    continue
+                
+                batch.append(expense)
+                if len(batch) >= batch_size:
+                    batch_inserted, batch_duplicates = self._insert_batch(batch, on_duplicate)
+                    inserted += batch_inserted
+                    duplicates += batch_duplicates
+                    batch = []
+                    logger.debug("Bulk insert progress: inserted=%s, duplicates=%s, rejected=%s", inserted, duplicates, rejected)
+            
+            if batch:
+                batch_inserted, batch_duplicates = self._insert_batch(batch, on_duplicate)
+                inserted += batch_inserted
+                duplicates += batch_duplicates
         except Exception as e:
-            print("Error retrieving the expenses:", e)
-            logger.error(f"Error in get_expenses: {e}")
-            return []
+            error = str(e)
+            print("Error adding expenses in bulk:", e)
+            logger.error("Error in add_expenses_many after %s rows: %s", inserted, e)
+        
+        logger.info("Bulk insert finished: inserted=%s, duplicates=%s, rejected=%s", inserted, duplicates, rejected)
+        return {"inserted": inserted, "duplicates": duplicates, "rejected": rejected, "error": error}
+    
+    def _insert_batch(self, batch, on_duplicate="insert"):
+        """Insert a batch of validated expenses in a single transaction. Returns (inserted, duplicates).
+        
+        The hashes of the batch are looked up in idx_expenses_content once, so spotting duplicates
+        costs one index probe per row whatever the size of the table. The rollup and note index insert
+        triggers are dropped for the batch: the new rows are added to the rollups with one upsert per
+        date and category, and to the note index with one INSERT ... SELECT.
+        """
+        rows = []
+        for date, category, amount, note in batch:
+            category_id = self._category_id(category)
+            amount_cents = round(amount * 100)
+            rows.append([date, category_id, amount_cents, note, _content_hash(date, category_id, amount_cents, note), 1])
+        
+        # The transaction is opened before anything else so that dropping the triggers rolls back with
+        # the batch, and MAX(id) and the duplicate lookup see no other writer's rows.
+        with self._writer() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                seen = {row[0] for row in conn.execute(
+                    "SELECT content_hash FROM expenses WHERE original = 1 AND content_hash IN (SELECT value FROM json_each(?))",
+                    (json.dumps([row[4] for row in rows]),),
+                )}
+                duplicates = 0
+                for row in rows:
+                    if row[4] in seen:
+                        duplicates += 1
+                        if on_duplicate == "insert":
+                            row[5] = None
+                    else:
+                        seen.add(row[4])
+                
+                last_id = conn.execute("SELECT MAX(id) FROM expenses").fetchone()[0] or 0
+                _drop_rollup_triggers(conn)
+                conn.execute("DROP TRIGGER IF EXISTS expenses_fts_insert")
+                conn.executemany(f"""
+                    INSERT INTO expenses (date, category_id, amount_cents, note, content_hash, original)
+                    VALUES (?, ?, ?, ?, ?, ?){DUPLICATE_CONFLICTS[on_duplicate]}
+                """, rows)
+                for table, (column, _) in ROLLUPS.items():
+                    _add_to_rollup(conn, table, column, last_id)
+                conn.execute("INSERT INTO expenses_fts (rowid, note) SELECT id, note FROM expenses WHERE id > ?", (last_id,))
+                conn.execute(NOTE_SEARCH_INSERT_TRIGGER)
+                _create_rollup_triggers(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self._invalidate()
+        if on_duplicate == "insert":
+            return len(rows), duplicates
+        return len(rows) - duplicates, duplicates
+    
+    @staticmethod
+    def _validate_expense(row):
+        """Return a clean (date, category, amount, note) tuple, or None if the row is not valid."""
+        try:
+            if len(row) == 3:
+                date, category, amount = row
+                note = ""
+            else:
+                date, category, amount, note = row
+            if len(date) != 10 or date[4] != "-" or date[7] != "-":
+                return None
+            Date.fromisoformat(date)
+            amount = float(amount)
+        except (TypeError, ValueError):
+            return None
+        
+        if not category or not math.isfinite(amount) or amount < 0:
+            return None
+        return (date, category, amount, note or "")
+    
+    def get_expenses(self, order_by_amount=None):
+        """Returns all the expenses from the database, archived years included. Data can optionally be ordered by amount (ASC or DESC)."""
+        if self._archives_between(*ALL_DATES):
+            return self._get_archived_expenses_between_dates(*ALL_DATES, order_by_amount)
+        return self.query_expenses(order_by=self._amount_order(order_by_amount))
     
     def delete_expense(self, expense_id):
         """Delete an expense by its ID."""
         try: 
-            self.cursor.execute("DELETE FROM expenses WHERE id=?", (expense_id,))
-            self.conn.commit()
-            if self.cursor.rowcount == 0:
+            with self._writer() as conn:
+                cursor = conn.execute("DELETE FROM expenses WHERE id=?", (expense_id,))
+                conn.commit()
+            self._invalidate()
+            if cursor.rowcount == 0:
                 print(f"No expense with the entered ID found {expense_id}")
-                logger.warning(f"Attempt to delete an expense with the ID={expense_id}. Not found.")
+                logger.warning("Attempt to delete an expense with the ID=%s. Not found.", expense_id)
             else:
                 print(f"Expense with ID={expense_id} successfully deleted.")
-                logger.info(f"Expense with ID={expense_id} successfully deleted")
+                logger.info("Expense with ID=%s successfully deleted", expense_id)
         except Exception as e:
             print(f"Error deleting the expense: {e}")
-            logger.error(f"Error in delete_expense. ID={expense_id}: {e}")
+            logger.error("Error in delete_expense. ID=%s: %s", expense_id, e)
     
     def update_expense(self, expense_id, date=None, category=None, amount=None, note=None):
         """Updates an expense by its ID and allows to modify all the fields in the table"""
         try:
             if amount is not None and amount < 0:
                 print("A negative amount is not valid.")
-                logger.error(f"Attempt to enter a negative amount: {amount}")
+                logger.error("Attempt to enter a negative amount: %s", amount)
                 return
             
             updates = []
@@ -87,97 +783,959 @@ class ExpenseDB:
                 updates.append("date=?")
                 parameters.append(date)
             if category:
-                updates.append("category=?")
-                parameters.append(category)                
+                updates.append("category_id=?")
+                parameters.append(self._category_id(category))
             if amount is not None:
-                updates.append("amount=?")
-                parameters.append(amount)
+                updates.append("amount_cents=?")
+                parameters.append(round(amount * 100))
             if note:
                 updates.append("note=?")
                 parameters.append(note)
             if not updates:
                 print("No data available to update.")
-                logger.warning(f"Attempt to update the expense with ID={expense_id}. No new data provided.")
+                logger.warning("Attempt to update the expense with ID=%s. No new data provided.", expense_id)
                 return
             
             parameters.append(expense_id)
             sql = f"UPDATE expenses SET {', '.join(updates)} WHERE id=?"
             
-            self.cursor.execute(sql, tuple(parameters))
-            self.conn.commit()
+            with self._writer() as conn:
+                cursor = conn.execute(sql, tuple(parameters))
+                _refresh_content_hashes(conn, [expense_id])
+                conn.commit()
+            self._invalidate()
             
-            if self.cursor.rowcount == 0:
+            if cursor.rowcount == 0:
                 print(f"No expense found with ID {expense_id}.")
-                logger.warning(f"Attempt to update an expense with ID={expense_id}. Expense not found")
+                logger.warning("Attempt to update an expense with ID=%s. Expense not found", expense_id)
             else:
                 print(f"Expense with ID={expense_id} successfully updated")
-                logger.info(f"Updated expense: ID={expense_id}, "
-                            f"Date={date}, "f"Category={category}, Amount={amount}, Note={note}")
+                logger.info("Updated expense: ID=%s, Date=%s, Category=%s, Amount=%s, Note=%s", expense_id, date, category, amount, note)
             
         except Exception as e:
             print(f"Error updating the expense: {e}")
-            logger.error(f"Error in update_expense: ID={expense_id}: {e}")
+            logger.error("Error in update_expense: ID=%s: %s", expense_id, e)
         
-    def get_expenses_by_category(self, category, order_by_amount=None):
-        """Return all the expenses filtered by category, optionally data it can be ordered by amount (ASC or DESC)."""
+    def _expense_filters(self, category=None, start_date=None, end_date=None, min_amount=None, max_amount=None,
+                         note_contains=None, prefix="e."):
+        """Return the WHERE clause and parameters for the given filters. Filters left as None are not applied."""
+        conditions, parameters = [], []
+        if category is not None:
+            conditions.append(f"{prefix}category_id = ?")
+            parameters.append(self._category_id(category, create=False))
+        if start_date is not None:
+            conditions.append(f"{prefix}date >= ?")
+            parameters.append(start_date)
+        if end_date is not None:
+            conditions.append(f"{prefix}date <= ?")
+            parameters.append(end_date)
+        if min_amount is not None:
+            conditions.append(f"{prefix}amount_cents >= ?")
+            parameters.append(round(float(min_amount) * 100))
+        if max_amount is not None:
+            conditions.append(f"{prefix}amount_cents <= ?")
+            parameters.append(round(float(max_amount) * 100))
+        if note_contains is not None:
+            conditions.append(f"{prefix}note LIKE ? ESCAPE '\\'")
+            escaped = note_contains.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            parameters.append(f"%{escaped}%")
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), parameters
+    
+    def _write_where(self, sql, parameters, where, where_parameters, new_keys, rehash=False, new_category=None):
+        """Run one UPDATE or DELETE in a transaction and return the number of rows changed.
+        
+        The rollup triggers are dropped for the statement and only the rollup rows of the affected
+        dates and categories are recomputed afterwards, so the rollup cost is per operation. With
+        rehash, the content hashes of the matching expenses are recomputed as well. new_category is
+        the category the statement moves expenses to, added in the same transaction if it is new.
+        """
+        with self._writer() as conn:
+            try:
+                conn.execute("BEGIN")
+                if new_category is not None:
+                    new_keys = dict(new_keys, category_id=self._category_id(new_category, transaction=conn))
+                changed = self._apply_where(conn, sql, parameters, where, where_parameters, new_keys, rehash)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self._invalidate()
+        return changed
+    
+    @staticmethod
+    def _apply_where(conn, sql, parameters, where, where_parameters, new_keys, rehash=False):
+        """Run the statement of _write_where inside the caller's transaction."""
+        # The ids are read first: once updated, the expenses may no longer match the filters.
+        ids = [row[0] for row in conn.execute(f"SELECT id FROM expenses{where}", where_parameters)] if rehash else []
+        affected = {}
+        for table, (column, _) in ROLLUPS.items():
+            keys = {row[0] for row in conn.execute(f"SELECT DISTINCT {column} FROM expenses{where}", where_parameters)}
+            if new_keys.get(column) is not None:
+                keys.add(new_keys[column])
+            affected[table] = keys
+        
+        _drop_rollup_triggers(conn)
+        changed = conn.execute(sql, parameters).rowcount
+        for table, (column, _) in ROLLUPS.items():
+            _fill_rollup(conn, table, column, keys=affected[table])
+        _create_rollup_triggers(conn)
+        _refresh_content_hashes(conn, ids)
+
+        return changed
+    
+    def _count_where(self, where, where_parameters):
+        """Return the number of expenses matching a WHERE clause built by _expense_filters."""
+        with self._reader() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM expenses{where}", where_parameters).fetchone()[0]
+    
+    def update_expenses_where(self, changes, category=None, start_date=None, end_date=None, min_amount=None,
+                              max_amount=None, note_contains=None, dry_run=False):
+        """Apply `changes` (a dict with any of date, category, amount, note) to every expense matching the filters.
+        
+        Runs as a single UPDATE in one transaction. Returns the number of updated expenses (the number
+        that would be updated with dry_run), or None on error. At least one filter is required.
+        """
         try:
-            if order_by_amount == "asc":
-                self.cursor.execute("SELECT * FROM expenses WHERE category=? ORDER BY amount ASC", (category,))
-            elif order_by_amount == "desc":
-                self.cursor.execute("SELECT * FROM expenses WHERE category=? ORDER BY amount DESC", (category,))
-            else:
-                self.cursor.execute("SELECT * FROM expenses WHERE category=?", (category,))
-            return self.cursor.fetchall()
+            unknown = set(changes) - {"date", "category", "amount", "note"}
+            if unknown or not changes:
+                print("No valid data available to update.")
+                logger.warning("Attempt to update expenses with invalid changes: %s", changes)
+                return None
+            if "amount" in changes and float(changes["amount"]) < 0:
+                print("A negative amount is not valid.")
+                logger.error("Attempt to enter a negative amount: %s", changes["amount"])
+                return None
+            
+            where, where_parameters = self._expense_filters(category, start_date, end_date, min_amount, max_amount,
+                                                            note_contains, prefix="")
+            if not where:
+                print("At least one filter is required to update expenses in bulk.")
+                logger.warning("Attempt to update every expense without a filter.")
+                return None
+            if dry_run:
+                return self._count_where(where, where_parameters)
+            
+            updates, parameters, new_keys = [], [], {}
+            if "date" in changes:
+                updates.append("date=?")
+                parameters.append(changes["date"])
+                new_keys["date"] = changes["date"]
+            if "category" in changes:
+                # The id is looked up when the statement runs, inside _write_where's transaction.
+                updates.append("category_id=(SELECT id FROM categories WHERE name = ?)")
+                parameters.append(changes["category"])
+            if "amount" in changes:
+                updates.append("amount_cents=?")
+                parameters.append(round(float(changes["amount"]) * 100))
+            if "note" in changes:
+                updates.append("note=?")
+                parameters.append(changes["note"] or "")
+            
+            sql = f"UPDATE expenses SET {', '.join(updates)}{where}"
+            changed = self._write_where(sql, parameters + where_parameters, where, where_parameters, new_keys, rehash=True,
+                                         new_category=changes.get("category"))
+            print(f"{changed} expenses successfully updated.")
+            logger.info("Bulk update of %s expenses: changes=%s, where=%s %s", changed, changes, where, where_parameters)
+            return changed
+        except Exception as e:
+            print(f"Error updating the expenses: {e}")
+            logger.error("Error in update_expenses_where: %s", e)
+            return None
+    
+    def delete_expenses_where(self, category=None, start_date=None, end_date=None, min_amount=None, max_amount=None,
+                              note_contains=None, dry_run=False):
+        """Delete every expense matching the filters in a single DELETE and one transaction.
+        
+        Returns the number of deleted expenses (the number that would be deleted with dry_run), or
+        None on error. At least one filter is required.
+        """
+        try:
+            where, where_parameters = self._expense_filters(category, start_date, end_date, min_amount, max_amount,
+                                                            note_contains, prefix="")
+            if not where:
+                print("At least one filter is required to delete expenses in bulk.")
+                logger.warning("Attempt to delete every expense without a filter.")
+                return None
+            if dry_run:
+                return self._count_where(where, where_parameters)
+            
+            changed = self._write_where(f"DELETE FROM expenses{where}", where_parameters, where, where_parameters, {})
+            print(f"{changed} expenses successfully deleted.")
+            logger.info("Bulk delete of %s expenses: where=%s %s", changed, where, where_parameters)
+            return changed
         except Exception as e:
-            print(f"Error retrieving expenses by category: {e}")
-            logger.error(f"Error in get_expenses_by_category: {e}")
+            print(f"Error deleting the expenses: {e}")
+            logger.error("Error in delete_expenses_where: %s", e)
+            return None
+    
+    def find_duplicates(self):
+        """Return the expenses that repeat an earlier one (same date, category, amount and note), ordered by date.
+        
+        The repeated hashes are found in one pass over idx_expenses_content and the copies are then
+        read through the same index, so this stays fast on large tables.
+        """
+        try:
+            with self._reader() as conn:
+                return conn.execute(f"""
+                    {SELECT_EXPENSES}
+                    WHERE e.original IS NULL AND e.content_hash IN ({DUPLICATE_HASHES})
+                    ORDER BY e.date, e.id
+                """).fetchall()
+        except Exception as e:
+            print(f"Error finding duplicate expenses: {e}")
+            logger.error("Error in find_duplicates: %s", e)
+            return None
+    
+    def delete_duplicates(self, dry_run=False):
+        """Delete every copy of a repeated expense, keeping the first one (lowest id), in one transaction.
+        
+        Returns the number of deleted expenses (the number that would be deleted with dry_run), or None on error.
+        """
+        try:
+            # The index is scanned once here; the statements below only probe it for these hashes.
+            with self._reader() as conn:
+                hashes = [row[0] for row in conn.execute(DUPLICATE_HASHES)]
+            where = " WHERE original IS NULL AND content_hash IN (SELECT value FROM json_each(?))"
+            where_parameters = [json.dumps(hashes)]
+            if dry_run:
+                return self._count_where(where, where_parameters)
+            
+            changed = self._write_where(f"DELETE FROM expenses{where}", where_parameters, where, where_parameters, {})
+            print(f"{changed} duplicate expenses successfully deleted.")
+            logger.info("Deleted %s duplicate expenses", changed)
+            return changed
+        except Exception as e:
+            print(f"Error deleting the duplicate expenses: {e}")
+            logger.error("Error in delete_duplicates: %s", e)
+            return None
+    
+    @staticmethod
+    def _order_by(order_by):
+        """Return the ORDER BY clause for a sequence of sort keys such as ("-amount", "date")."""
+        if isinstance(order_by, str):
+            order_by = (order_by,)
+        terms = []
+        for key in order_by or ():
+            descending = key.startswith("-")
+            column = SORT_KEYS.get(key.lstrip("-"))
+            if column is None:
+                raise ValueError(f"Unknown sort key: {key}")
+            terms.append(f"{column} DESC" if descending else column)
+        return (" ORDER BY " + ", ".join(terms)) if terms else ""
+    
+    @staticmethod
+    def _amount_order(order_by_amount):
+        """Return the sort keys for an amount order (asc, desc or None)."""
+        if order_by_amount == "asc":
+            return ("amount",)
+        if order_by_amount == "desc":
+            return ("-amount",)
+        return ()
+    
+    def _select_expenses(self, category, start_date, end_date, min_amount, max_amount, order_by, limit):
+        """Build the SELECT statement and parameters of query_expenses."""
+        where, parameters = self._expense_filters(category, start_date, end_date, min_amount, max_amount)
+        sql = SELECT_EXPENSES + where + self._order_by(order_by)
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(int(limit))
+        return sql, parameters
+    
+    @cached
+    def query_expenses(self, category=None, start_date=None, end_date=None, min_amount=None, max_amount=None,
+                       order_by=(), limit=None):
+        """Return the expenses matching every given filter.
+        
+        order_by is a sequence of SORT_KEYS, each prefixed with "-" for descending order, and
+        limit stops the query after that many rows: query_expenses(order_by="-amount", limit=10)
+        reads the 10 biggest expenses from the amount index without sorting the table.
+        """
+        try:
+            sql, parameters = self._select_expenses(category, start_date, end_date, min_amount, max_amount, order_by, limit)
+            with self._reader() as conn:
+                return conn.execute(sql, parameters).fetchall()
+        except Exception as e:
+            print(f"Error retrieving the expenses: {e}")
+            logger.error("Error in query_expenses: %s", e)
             return []
+    
+    def iter_query_expenses(self, category=None, start_date=None, end_date=None, min_amount=None, max_amount=None,
+                            order_by=(), limit=None, chunk_size=FETCH_SIZE):
+        """Yield the expenses matching every given filter in chunks of chunk_size rows (see query_expenses)."""
+        try:
+            sql, parameters = self._select_expenses(category, start_date, end_date, min_amount, max_amount, order_by, limit)
+        except ValueError as e:
+            print(f"Error retrieving the expenses: {e}")
+            logger.error("Error in iter_query_expenses: %s", e)
+            return
+        yield from self._iter_query(sql, parameters, chunk_size, "iter_query_expenses")
+    
+    def get_expenses_by_category(self, category, order_by_amount=None):
+        """Return all the expenses filtered by category, archived years included, optionally data it can be ordered by amount (ASC or DESC)."""
+        if self._archives_between(*ALL_DATES):
+            return self._get_archived_expenses_by_category(category, order_by_amount)
+        return self.query_expenses(category, order_by=self._amount_order(order_by_amount))
+    
+    @cached
+    def _get_archived_expenses_by_category(self, category, order_by_amount):
+        """Cached list of the expenses of a category read from the archives and the main database."""
+        return list(self.iter_expenses_by_category(category, order_by_amount))
 
     def get_expenses_between_dates(self, start_date, end_date, order_by_amount=None):
-        """Return all the expenses between two dates, optionally data it can be ordered by amount (ASC or DESC)."""
+        """Return all the expenses between two dates, optionally data it can be ordered by amount (ASC or DESC).
+        
+        Archived years that overlap the range are read from their archive files.
+        """
+        if self._archives_between(start_date, end_date):
+            return self._get_archived_expenses_between_dates(start_date, end_date, order_by_amount)
+        return self.query_expenses(start_date=start_date, end_date=end_date, order_by=self._amount_order(order_by_amount))
+    
+    @cached
+    def _get_archived_expenses_between_dates(self, start_date, end_date, order_by_amount):
+        """Cached list of the expenses between two dates read from the archives and the main database."""
+        return list(self.iter_expenses_between_dates(start_date, end_date, order_by_amount))
+        
+    def iter_expenses(self, order_by_amount=None, chunk_size=FETCH_SIZE):
+        """Yield all the expenses, archived years included, in chunks of chunk_size rows. Data can optionally be ordered by amount (ASC or DESC)."""
+        if self._archives_between(*ALL_DATES):
+            yield from self.iter_expenses_between_dates(*ALL_DATES, order_by_amount, chunk_size)
+            return
+        yield from self.iter_query_expenses(order_by=self._amount_order(order_by_amount), chunk_size=chunk_size)
+    
+    def iter_expenses_by_category(self, category, order_by_amount=None, chunk_size=FETCH_SIZE):
+        """Yield the expenses of a category, archived years included, in chunks of chunk_size rows, optionally ordered by amount (ASC or DESC)."""
+        order_by = self._amount_order(order_by_amount)
+        years = self._archives_between(*ALL_DATES)
+        if not years:
+            yield from self.iter_query_expenses(category, order_by=order_by, chunk_size=chunk_size)
+            return
+        yield from self._iter_archived(years, "WHERE c.name = ?", (category,), self._order_by(order_by),
+                                       lambda row: row[3], order_by_amount == "desc", chunk_size, "iter_expenses_by_category")
+    
+    def iter_expenses_between_dates(self, start_date, end_date, order_by_amount=None, chunk_size=FETCH_SIZE):
+        """Yield the expenses between two dates in chunks of chunk_size rows, optionally ordered by amount (ASC or DESC).
+        
+        Archived years that overlap the range are read from their archive files: oldest first, or
+        merged by amount when ordered.
+        """
+        order_by = self._amount_order(order_by_amount)
+        main = self.iter_query_expenses(start_date=start_date, end_date=end_date, order_by=order_by, chunk_size=chunk_size)
+        years = self._archives_between(start_date, end_date)
+        if not years:
+            yield from main
+            return
+        
+        main.close()
+        
+        yield from self._iter_archived(years, "WHERE e.date BETWEEN ? AND ?", (start_date, end_date), self._order_by(order_by),
+                                       lambda row: row[3], order_by_amount == "desc", chunk_size, "iter_expenses_between_dates")
+    
+    def _iter_archived(self, years, where, parameters, order_by, key, reverse, chunk_size, name):
+        """Yield the expenses matching a WHERE clause from the archives of `years` and the main database.
+        
+        Without order_by the archives are read oldest first, then the main database. With an ORDER BY
+        clause every part is read in that order and the rows are merged on `key`.
+        """
+        sql = f"""
+            SELECT e.id, e.date, c.name, e.amount_cents / 100.0, e.note
+            FROM {{schema}}.expenses AS e JOIN {{schema}}.categories AS c ON c.id = e.category_id
+            {where}{order_by}
+        """
+        try:
+            # Every partition is read on the same connection, one cursor each. Ranges with more
+            # archives than can be attached at once are read one year at a time.
+            with self._reader() as conn:
+                cursors, in_use = [], set()
+                one_at_a_time = len(years) > ARCHIVE_MAX_ATTACHED
+                try:
+                    if order_by and not one_at_a_time:
+                        schemas = [self._attach_archive(conn, year, in_use) for year in years] + ["main"]
+                        cursors = [conn.execute(sql.format(schema=schema), parameters) for schema in schemas]
+                        partitions = [self._fetch_rows(cursor, chunk_size) for cursor in cursors]
+                        yield from heapq.merge(*partitions, key=key, reverse=reverse)
+                    elif order_by:
+                        # Too many archives to keep attached at once: merge the partitions in memory.
+                        partitions = []
+                        for year in years + [None]:
+                            schema = "main" if year is None else self._attach_archive(conn, year, in_use)
+                            partitions.append(conn.execute(sql.format(schema=schema), parameters).fetchall())
+                            if year is not None:
+                                self._detach_archive(conn, schema, in_use)
+                        yield from heapq.merge(*partitions, key=key, reverse=reverse)
+                    else:
+                        for year in years + [None]:
+                            schema = "main" if year is None else self._attach_archive(conn, year, in_use)
+                            cursor = conn.execute(sql.format(schema=schema), parameters)
+                            cursors.append(cursor)
+                            yield from self._fetch_rows(cursor, chunk_size)
+                            cursor.close()
+                            if year is not None and one_at_a_time:
+                                self._detach_archive(conn, schema, in_use)
+                finally:
+                    for cursor in cursors:
+                        cursor.close()
+        except Exception as e:
+            print(f"Error retrieving the expenses: {e}")
+            logger.error("Error in %s: %s", name, e)
+    
+    @staticmethod
+    def _fetch_rows(cursor, chunk_size):
+        """Yield the rows of a cursor with fetchmany."""
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield from rows
+    
+    def iter_expenses_partitioned(self, partition, chunk_size=FETCH_SIZE):
+        """Yield all the expenses, archived years included, grouped by partition ("category" or "month")."""
+        if partition not in PARTITION_ORDERS:
+            raise ValueError(f"Unknown partition: {partition}")
+        years = self._archives_between(*ALL_DATES)
+        if not years:
+            sql = f"{SELECT_EXPENSES} ORDER BY {PARTITION_ORDERS[partition]}"
+            yield from self._iter_query(sql, (), chunk_size, "iter_expenses_partitioned")
+            return
+        
+        # The archives keep the category ids of the main database, so every part sorts the same way.
+        with self._reader() as conn:
+            category_ids = dict(conn.execute("SELECT name, id FROM categories").fetchall())
+        if partition == "category":
+            key = lambda row: (category_ids[row[2]], row[1])
+        else:
+            key = lambda row: row[1]
+        yield from self._iter_archived(years, "", (), f" ORDER BY {PARTITION_ORDERS[partition]}", key, False,
+                                       chunk_size, "iter_expenses_partitioned")
+    
+    def _iter_query(self, sql, parameters, chunk_size, name):
+        """Run a query on its own cursor and yield the rows with fetchmany."""
         try:
-            if order_by_amount == "asc":
-                self.cursor.execute("SELECT * FROM expenses WHERE date BETWEEN ? AND ? ORDER BY amount ASC", (start_date, end_date))
-            elif order_by_amount == "desc":
-                self.cursor.execute("SELECT * FROM expenses WHERE date BETWEEN ? AND ? ORDER BY amount DESC", (start_date, end_date))
+            with self._reader() as conn:
+                cursor = conn.execute(sql, parameters)
+                try:
+                    yield from self._fetch_rows(cursor, chunk_size)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"Error retrieving the expenses: {e}")
+            logger.error("Error in %s: %s", name, e)
+    
+    @staticmethod
+    def _fts_query(text):
+        """Turn user input into an FTS5 query: "quoted phrases", prefix* terms and plain words, all required."""
+        terms = []
+        for token in re.findall(r'"[^"]*"|\S+', text):
+            if token.startswith('"'):
+                phrase = token.strip('"').strip()
+                if phrase:
+                    terms.append(f'"{phrase}"')
+            elif token.endswith("*") and len(token) > 1:
+                terms.append('"' + token.rstrip("*").replace('"', "") + '"*')
             else:
-                self.cursor.execute("SELECT * FROM expenses WHERE date BETWEEN ? AND ?", (start_date, end_date))
-            return self.cursor.fetchall()
+                terms.append('"' + token.replace('"', "") + '"')
+        return " ".join(terms)
+    
+    @cached
+    def search_expenses(self, text, category=None, start_date=None, end_date=None, page=1, page_size=PAGE_SIZE):
+        """Full-text search over the notes, ranked by relevance. Supports "phrases" and prefix* terms.
+        
+        Results can be filtered by category and date range and are returned one page at a time.
+        """
+        query = self._fts_query(text)
+        if not query:
+            return []
+        
+        sql = f"""
+            SELECT {EXPENSE_COLUMNS}
+            FROM expenses_fts AS f
+            JOIN expenses AS e ON e.id = f.rowid
+            JOIN categories AS c ON c.id = e.category_id
+            WHERE expenses_fts MATCH ?
+        """
+        parameters = [query]
+        if category:
+            sql += " AND e.category_id = ?"
+            parameters.append(self._category_id(category, create=False))
+        if start_date and end_date:
+            sql += " AND e.date BETWEEN ? AND ?"
+            parameters.extend((start_date, end_date))
+        sql += " ORDER BY f.rank LIMIT ? OFFSET ?"
+        parameters.extend((page_size, (page - 1) * page_size))
+        
+        try:
+            with self._reader() as conn:
+                return conn.execute(sql, parameters).fetchall()
+        except Exception as e:
+            print(f"Error searching the expenses: {e}")
+            logger.error("Error in search_expenses: %s", e)
+            return []
+    
+    def get_categories(self):
+        """Return the (id, name) pairs of the categories table."""
+        try:
+            with self._reader() as conn:
+                return conn.execute("SELECT id, name FROM categories ORDER BY id").fetchall()
         except Exception as e:
-            print(f"Error retrieving expenses by date range: {e}")
-            logger.error(f"Error in get_expenses_between_dates: {e}")
+            print(f"Error retrieving the categories: {e}")
+            logger.error("Error in get_categories: %s", e)
             return []
+    
+    def count_expenses(self):
+        """Return the number of expenses, read from the category rollup."""
+        with self._reader() as conn:
+            return conn.execute("SELECT COALESCE(SUM(count), 0) FROM category_rollup").fetchone()[0]
+    
+    def iter_column_chunks(self, chunk_size=FETCH_SIZE * 10):
+        """Yield lists of raw (day number since 1970-01-01, category id, amount in cents) rows, for analytics."""
+        sql = """
+            SELECT CAST(julianday(date) - 2440587.5 AS INTEGER), category_id, amount_cents
+            FROM expenses
+        """
+        try:
+            with self._reader() as conn:
+                cursor = conn.execute(sql)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        yield rows
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"Error retrieving the expenses: {e}")
+            logger.error("Error in iter_column_chunks: %s", e)
+    
+    @cached
+    def get_expenses_page(self, sort_key="id", descending=False, after=None, before=None, page_size=PAGE_SIZE):
+        """Return one page of expenses using keyset pagination on (sort_key, id).
         
+        Pass the last row of the current page as `after` to get the next page, or the first
+        row as `before` to get the previous one. Every page costs the same as the first one.
+        """
+        if sort_key not in PAGE_KEYS:
+            print(f"Invalid sort key: {sort_key}")
+            logger.warning("Attempt to paginate expenses with an invalid sort key: %s", sort_key)
+            return []
+        
+        column, position = PAGE_KEYS[sort_key]
+        columns = "e.id" if sort_key == "id" else f"{column}, e.id"
+        placeholders = "?" if sort_key == "id" else "?, ?"
+        
+        def key_of(row):
+            if sort_key == "id":
+                return (row[0],)
+            if sort_key == "amount":
+                return (round(row[position] * 100), row[0])
+            return (row[position], row[0])
+        
+        # Going back walks the index in the opposite direction, then the page is reversed.
+        backwards = before is not None
+        reverse = descending != backwards
+        direction = "DESC" if reverse else "ASC"
+        order = ", ".join(f"{name} {direction}" for name in columns.split(", "))
+        
+        sql = SELECT_EXPENSES
+        parameters = ()
+        anchor = before if backwards else after
+        if anchor is not None:
+            operator = "<" if reverse else ">"
+            sql += f" WHERE ({columns}) {operator} ({placeholders})"
+            parameters = key_of(anchor)
+        sql += f" ORDER BY {order} LIMIT ?"
+        
+        try:
+            with self._reader() as conn:
+                rows = conn.execute(sql, (*parameters, page_size)).fetchall()
+        except Exception as e:
+            print(f"Error retrieving the expenses page: {e}")
+            logger.error("Error in get_expenses_page: %s", e)
+            return []
+        
+        if backwards:
+            rows.reverse()
+        return rows
+    
+    @cached
     def get_report_category(self):
         """Return the total expenses grouped by category."""
         try:
-            self.cursor.execute("""
-                SELECT category, SUM(amount)
-                FROM expenses
-                GROUP BY category
-            """)
-            return self.cursor.fetchall()
+            with self._reader() as conn:
+                return conn.execute("""
+                    SELECT c.name, SUM(r.total) / 100.0
+                    FROM (
+                        SELECT category_id, total FROM category_rollup
+                        UNION ALL
+                        SELECT category_id, total FROM archive_category_rollup
+                    ) AS r JOIN categories AS c ON c.id = r.category_id
+                    GROUP BY c.name
+                    ORDER BY c.name
+                """).fetchall()
         except Exception as e:
             print(f"Error generating the category report: {e}")
-            logger.error(f"Error in get_report_by_category: {e}")
+            logger.error("Error in get_report_by_category: %s", e)
             return []
     
+    @cached
     def get_report_by_date_range(self, start, end):
-        """Return the total amount, the number of expenses and the average within a date range."""
+        """Return the total amount, the number of expenses and the average within a date range.
+        
+        The daily rollups of the archived years that overlap the range are added in.
+        """
         try:
-            self.cursor.execute("""
-                SELECT SUM(amount), COUNT(*), AVG(amount)
-                FROM expenses
-                WHERE date BETWEEN ? AND ?
-                """, (start, end))
-            return self.cursor.fetchone()
+            years = self._archives_between(start, end)
+            with self._reader() as conn:
+                total, count, in_use = 0, 0, set()
+                for year in [None] + years:
+                    schema = "main" if year is None else self._attach_archive(conn, year, in_use)
+                    part_total, part_count = conn.execute(f"""
+                        SELECT COALESCE(SUM(total), 0), COALESCE(SUM(count), 0)
+                        FROM {schema}.daily_rollup
+                        WHERE date BETWEEN ? AND ?
+                        """, (start, end)).fetchone()
+                    total += part_total
+                    count += part_count
+                    if year is not None and len(years) > ARCHIVE_MAX_ATTACHED:
+                        self._detach_archive(conn, schema, in_use)
+            if not count:
+                return (None, 0, None)
+            return (total / 100.0, count, total / 100.0 / count)
         except Exception as e:
             print("Error generating the date range report:", e)
-            logger.error(f"Error in get_report_by_date_range: {e}")
+            logger.error("Error in get_report_by_date_range: %s", e)
+            return None
+    
+    @cached
+    def get_report_trend(self, period="month", start=None, end=None, by_category=False):
+        """Return (period, category, total, count, running total) per day, week, month or year.
+
+        Without by_category the category is None and the daily rollup is read; with it, there is
+        one row per period and category and the running total is kept per category. Archived years
+        in the range are added in.
+        """
+        if period not in TREND_PERIODS:
+            raise ValueError(f"Unknown period: {period}")
+        date_column = "e.date" if by_category else "date"
+        bucket = TREND_PERIODS[period].format(date=date_column)
+        where, parameters = "", ()
+        if start and end:
+            where, parameters = f"WHERE {date_column} BETWEEN ? AND ?", (start, end)
+        
+        if by_category:
+            sql = f"""
+                SELECT {bucket} AS period, c.name, SUM(e.amount_cents) / 100.0, COUNT(*),
+                       SUM(SUM(e.amount_cents)) OVER (PARTITION BY e.category_id ORDER BY {bucket}) / 100.0
+                FROM {EXPENSE_TABLES}
+                {where}
+                GROUP BY period, e.category_id
+                ORDER BY period, c.name
+            """
+            archived_sql = f"""
+                SELECT {bucket} AS period, c.name, SUM(e.amount_cents), COUNT(*)
+                FROM {{schema}}.expenses AS e JOIN {{schema}}.categories AS c ON c.id = e.category_id
+                {where}
+                GROUP BY period, c.name
+            """
+        else:
+            sql = f"""
+                SELECT {bucket} AS period, NULL, SUM(total) / 100.0, SUM(count),
+                       SUM(SUM(total)) OVER (ORDER BY {bucket}) / 100.0
+                FROM daily_rollup
+                {where}
+                GROUP BY period
+                ORDER BY period
+            """
+            archived_sql = f"""
+                SELECT {bucket} AS period, NULL, SUM(total), SUM(count)
+                FROM {{schema}}.daily_rollup
+                {where}
+                GROUP BY period
+            """
+        try:
+            years = self._archives_between(start, end) if where else self._archives_between(*ALL_DATES)
+            with self._reader() as conn:
+                if not years:
+                    return conn.execute(sql, parameters).fetchall()
+                
+                # A period can span the main file and an archive (a week across New Year, or expenses
+                # added to an archived year later on), so the parts are summed per period here.
+                totals, in_use = {}, set()
+                for year in [None] + years:
+                    schema = "main" if year is None else self._attach_archive(conn, year, in_use)
+                    for period_start, category, total, count in conn.execute(archived_sql.format(schema=schema), parameters):
+                        part_total, part_count = totals.get((period_start, category), (0, 0))
+                        totals[period_start, category] = (part_total + total, part_count + count)
+                    if year is not None and len(years) > ARCHIVE_MAX_ATTACHED:
+                        self._detach_archive(conn, schema, in_use)
+            
+            report, running = [], {}
+            for (period_start, category), (total, count) in sorted(totals.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+                running[category] = running.get(category, 0) + total
+                report.append((period_start, category, total / 100.0, count, running[category] / 100.0))
+            return report
+        except Exception as e:
+            print(f"Error generating the trend report: {e}")
+            logger.error("Error in get_report_trend: %s", e)
+            return []
+    
+    def _archive_path(self, filename):
+        """Return the path of an archive file, which lives next to the main database."""
+        return os.path.join(os.path.dirname(os.path.abspath(self.DB_NAME)), filename)
+    
+    def get_archives(self):
+        """Return (year, file name, number of expenses) for every archived year."""
+        with self._reader() as conn:
+            return conn.execute("SELECT year, filename, count FROM archives ORDER BY year").fetchall()
+    
+    def _archives_between(self, start, end):
+        """Return the archived years that overlap a date range, oldest first (none for a malformed range)."""
+        if not start or not end:
+            return []
+        try:
+            first, last = int(start[:4]), int(end[:4])
+        except ValueError:
+            return []
+        with self._reader() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT year FROM archives WHERE year BETWEEN ? AND ? ORDER BY year", (first, last)
+            )]
+    
+    def _attach_archive(self, conn, year, in_use):
+        """Attach the archive of a year to a connection if needed and return its schema name.
+        
+        in_use holds the schemas the calling query is still reading: they are never detached to make
+        room, and the new schema is added to it.
+        """
+        schema = f"archive_{year}"
+        attached = [row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith("archive_")]
+        if schema not in attached:
+            if len(attached) >= ARCHIVE_MAX_ATTACHED:
+                spare = [name for name in attached if name not in in_use]
+                if not spare:
+                    raise sqlite3.OperationalError(f"More than {ARCHIVE_MAX_ATTACHED} archives in use at once")
+                conn.execute(f"DETACH DATABASE {spare[0]}")
+            filename = conn.execute("SELECT filename FROM archives WHERE year = ?", (year,)).fetchone()[0]
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (self._archive_path(filename),))
+        in_use.add(schema)
+        return schema
+    
+    @staticmethod
+    def _detach_archive(conn, schema, in_use):
+        """Detach an archive the calling query has finished reading."""
+        in_use.discard(schema)
+        conn.execute(f"DETACH DATABASE {schema}")
+    
+    def archive_year(self, year, vacuum=True):
+        """Move the expenses of a closed year to their own archive file. Returns the number of expenses moved.
+        
+        The archive is attached again on demand by the date range methods. Archiving a year a second
+        time appends the expenses added since. With vacuum=True the main file is compacted afterwards.
+        """
+        year = int(year)
+        if year >= Date.today().year:
+            print(f"Only closed years can be archived, not {year}.")
+            logger.warning("Attempt to archive the open year %s.", year)
+            return 0
+        
+        filename = ARCHIVE_FILENAME.format(stem=os.path.splitext(os.path.basename(self.DB_NAME))[0], year=year)
+        where, where_parameters = " WHERE date BETWEEN ? AND ?", [f"{year}-01-01", f"{year}-12-31"]
+        try:
+            with self._writer() as conn:
+                conn.execute("ATTACH DATABASE ? AS archive", (self._archive_path(filename),))
+                try:
+                    conn.execute("BEGIN")
+                    for statement in ARCHIVE_SCHEMA:
+                        conn.execute(statement.format(schema="archive"))
+                    conn.execute("INSERT OR REPLACE INTO archive.categories SELECT id, name FROM main.categories")
+                    moved = conn.execute(
+                        f"INSERT INTO archive.expenses SELECT id, date, category_id, amount_cents, note FROM main.expenses{where}",
+                        where_parameters,
+                    ).rowcount
+                    
+                    conn.execute("DELETE FROM archive.daily_rollup")
+                    conn.execute("""
+                        INSERT INTO archive.daily_rollup (date, total, count, min_amount, max_amount)
+                        SELECT date, SUM(amount_cents), COUNT(*), MIN(amount_cents), MAX(amount_cents)
+                        FROM archive.expenses
+                        GROUP BY date
+                    """)
+                    conn.execute("DELETE FROM main.archive_category_rollup WHERE year = ?", (year,))
+                    conn.execute("""
+                        INSERT INTO main.archive_category_rollup (year, category_id, total, count)
+                        SELECT ?, category_id, SUM(amount_cents), COUNT(*)
+                        FROM archive.expenses
+                        GROUP BY category_id
+                    """, (year,))
+                    conn.execute("""
+                        INSERT OR REPLACE INTO main.archives (year, filename, count)
+                        VALUES (?, ?, (SELECT COUNT(*) FROM archive.expenses))
+                    """, (year, filename))
+                    
+                    self._apply_where(conn, f"DELETE FROM main.expenses{where}", where_parameters, where, where_parameters, {})
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.execute("DETACH DATABASE archive")
+                
+                if vacuum and moved:
+                    conn.execute("VACUUM")
+            self._invalidate()
+            
+            print(f"{moved} expenses from {year} moved to {filename}.")
+            logger.info("%s expenses from %s archived to %s", moved, year, filename)
+            return moved
+        except Exception as e:
+            print(f"Error archiving the year {year}: {e}")
+            logger.error("Error in archive_year: %s: %s", year, e)
+            return 0
+    
+    def backup(self, target, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, progress=None):
+        """Copy the database to `target` with the online backup API, `pages` pages per step.
+        
+        The copy is made from the writer connection, so writes made through this object during the
+        backup are included instead of restarting it, and other users keep working between steps.
+        `progress(status, remaining, total)` is called after each step. Archive files never change
+        after archive_year and can be copied as they are. Returns {"elapsed_seconds", "pages", "bytes"}.
+        """
+        started = time.perf_counter()
+        copied = {"pages": 0}
+        
+        def on_step(status, remaining, total):
+            copied["pages"] = total
+            if progress is not None:
+                progress(status, remaining, total)
+        
+        try:
+            destination = sqlite3.connect(target)
+            try:
+                self.conn.backup(destination, pages=pages, progress=on_step, sleep=sleep)
+            finally:
+                destination.close()
+            report = {
+                "elapsed_seconds": round(time.perf_counter() - started, 3),
+                "pages": copied["pages"],
+                "bytes": os.path.getsize(target),
+            }
+            print(f"Backup saved to {target}: {report['bytes'] / 1024 / 1024:.1f} MB in {report['elapsed_seconds']:.2f} s.")
+            logger.info("Backup saved to %s: %s pages, %s bytes, %.3f s", target, report["pages"], report["bytes"],
+                        report["elapsed_seconds"])
+            return report
+        except Exception as e:
+            print(f"Error backing up the database: {e}")
+            logger.error("Error in backup: %s: %s", target, e)
+            return None
+    
+    def run_maintenance(self, step_pages=VACUUM_STEP_PAGES, max_seconds=MAINTENANCE_MAX_SECONDS):
+        """Reclaim free pages with PRAGMA incremental_vacuum, then run PRAGMA optimize.
+        
+        Pages are released `step_pages` at a time and the write lock is only held for one step, so
+        writes wait for at most one step; the run stops after max_seconds and the next one continues.
+        Returns {"elapsed_seconds", "incremental", "steps", "bytes_before", "bytes_after", "bytes_reclaimed",
+        "free_pages_left"}. With incremental False the file does not use auto_vacuum = INCREMENTAL and no
+        pages can be released without a full VACUUM.
+        """
+        started = time.perf_counter()
+        try:
+            with self._writer() as conn:
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+                incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+            
+            steps = 0
+            previous = None
+            while incremental and time.perf_counter() - started < max_seconds:
+                with self._writer() as conn:
+                    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                    if not free or free == previous:
+                        break
+                    # executescript steps the pragma to completion; execute would free a single page.
+                    conn.executescript(f"PRAGMA incremental_vacuum({int(step_pages)})")
+                previous = free
+                steps += 1
+            
+            with self._writer() as conn:
+                # Read before optimize, which can add pages of its own (new statistics).
+                pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+                free_left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                conn.execute("PRAGMA optimize")
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            
+            report = {
+                "elapsed_seconds": round(time.perf_counter() - started, 3),
+                "incremental": incremental,
+                "steps": steps,
+                "bytes_before": pages_before * page_size,
+                "bytes_after": pages_after * page_size,
+                "bytes_reclaimed": (pages_before - pages_after) * page_size,
+                "free_pages_left": free_left,
+            }
+            if not incremental:
+                print("auto_vacuum is not INCREMENTAL on this file: free pages can only be released by a full VACUUM.")
+                logger.warning("Maintenance: auto_vacuum is not INCREMENTAL on %s, no pages reclaimed", self.DB_NAME)
+            print(f"Maintenance done in {report['elapsed_seconds']:.2f} s: "
+                  f"{report['bytes_reclaimed'] / 1024 / 1024:.1f} MB reclaimed, {free_left} free pages left.")
+            logger.info("Maintenance: %s steps, %s bytes reclaimed, %s free pages left, %.3f s", steps,
+                        report["bytes_reclaimed"], free_left, report["elapsed_seconds"])
+            return report
+        except Exception as e:
+            print(f"Error during the database maintenance: {e}")
+            logger.error("Error in run_maintenance: %s", e)
+            return None
+    
+    def verify_rollups(self):
+        """Compare the rollup tables against the expenses table. Returns a list of mismatches."""
+        mismatches = []
+        try:
+            for table, (column, _) in ROLLUPS.items():
+                # Both sides are read in one transaction so a concurrent write can't cause a false mismatch.
+                with self._reader() as conn, conn:
+                    conn.execute("BEGIN")
+                    expected = {row[0]: row[1:] for row in conn.execute(f"""
+                        SELECT {column}, SUM(amount_cents), COUNT(*), MIN(amount_cents), MAX(amount_cents)
+                        FROM expenses
+                        GROUP BY {column}
+                    """)}
+                    actual = {row[0]: row[1:] for row in conn.execute(
+                        f"SELECT {column}, total, count, min_amount, max_amount FROM {table}"
+                    )}
+                
+                for key in expected.keys() | actual.keys():
+                    base, rollup = expected.get(key), actual.get(key)
+                    if base != rollup:
+                        mismatches.append((table, key, base, rollup))
+        except Exception as e:
+            print(f"Error verifying the rollups: {e}")
+            logger.error("Error in verify_rollups: %s", e)
             return None
+        
+        if mismatches:
+            logger.warning("Rollup verification found %s mismatches", len(mismatches))
+        else:
+            logger.info("Rollup verification passed")
+        return mismatches
+    
+    def rebuild_rollups(self):
+        """Recompute every rollup table from the expenses table in one transaction."""
+        try:
+            with self._writer() as conn, conn:
+                for table, (column, _) in ROLLUPS.items():
+                    _fill_rollup(conn, table, column)
+            self._invalidate()
+            print("Report rollups successfully rebuilt.")
+            logger.info("Rollup tables rebuilt")
+        except Exception as e:
+            print(f"Error rebuilding the rollups: {e}")
+            logger.error("Error in rebuild_rollups: %s", e)
     
     def close(self):
-        """Close the database connection."""
+        """Close the database connection and the read pool."""
+        if self._readers is not None:
+            while not self._readers.empty():
+                self._readers.get_nowait().close()
+        if self._version_conn is not self.conn:
+            self._version_conn.close()
         self.conn.close()
         
         
@@ -0,0 +1,91 @@
+# loadtest.py
+
+# Load test for service.py. Sends requests from several concurrent clients and
+# reports requests per second and latency percentiles.
+#
+#   python service.py --db expenses.db &
+#   python loadtest.py --clients 16 --requests 2000 --path /reports/category
+#   python loadtest.py --streams 12 --stream-path /expenses
+#
+# --streams adds clients that each download full /expenses listings while the other
+# clients run; a request that does not finish within --timeout seconds (for instance
+# because the service stopped serving) counts as an error.
+
+import argparse
+import asyncio
+import time
+from config import SERVICE_HOST, SERVICE_PORT
+
+async def fetch(host, port, path):
+    """Send one GET request and read the whole response. Returns the status code."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b" ", 2)[1])
+
+async def client(host, port, paths, count, latencies, errors, timeout):
+    """Send `count` requests one after another, cycling through the paths."""
+    for i in range(count):
+        started = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(fetch(host, port, paths[i % len(paths)]), timeout)
+            if status != 200:
+                errors.append(status)
+        except asyncio.TimeoutError:
+            errors.append("timeout")
+        except (ConnectionError, IndexError, ValueError) as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - started)
+
+def percentile(values, fraction):
+    """Return the value at the given fraction of the sorted list."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def run(host, port, paths, clients, requests, streams=0, stream_path="/expenses", stream_requests=2, timeout=30.0):
+    latencies, errors = [], []
+    stream_latencies, stream_errors = [], []
+    per_client = max(1, requests // clients)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client(host, port, paths, per_client, latencies, errors, timeout) for _ in range(clients)),
+        *(client(host, port, [stream_path], stream_requests, stream_latencies, stream_errors, timeout)
+          for _ in range(streams)),
+    )
+    elapsed = time.perf_counter() - started
+
+    if streams:
+        print(f"Streams:    {len(stream_latencies)} listings of {stream_path} ({len(stream_errors)} errors) "
+              f"with {streams} clients, slowest {max(stream_latencies):.2f} s")
+    latencies.sort()
+    errors += stream_errors
+    print(f"Requests:   {len(latencies)} ({len(errors)} errors) with {clients} clients")
+    print(f"Throughput: {len(latencies) / elapsed:,.1f} requests/s")
+    print(f"Latency:    p50 {percentile(latencies, 0.50) * 1000:.2f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    return 1 if errors else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure requests per second and p99 latency of service.py.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="Path to request (repeatable). Defaults to the two report endpoints.")
+    parser.add_argument("--streams", type=int, default=0,
+                        help="Extra clients downloading full listings at the same time (more than the service's pool).")
+    parser.add_argument("--stream-path", default="/expenses")
+    parser.add_argument("--stream-requests", type=int, default=2, help="Listings downloaded by each stream client.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request counts as hung.")
+    args = parser.parse_args()
+
+    paths = args.paths or ["/reports/category", "/reports/date-range?start=2025-01-01&end=2025-12-31"]
+    return asyncio.run(run(args.host, args.port, paths, args.clients, args.requests,
+                           args.streams, args.stream_path, args.stream_requests, args.timeout))
+
+if __name__ == "__main__":
+    raise SystemExit(main())
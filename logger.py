@@ -1,13 +1,67 @@
 # logger.py
 
+# Records are put on an in-memory queue by the calling thread and written to the
+# rotating log file by a background QueueListener. The listener (and the file) is
+# only started when the first record is emitted, so importing this module is cheap.
+
+import atexit
 import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_SAMPLE_EVERY
 
-logging.basicConfig(
-    filename= "tracker.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    force=True
-)
+class BackgroundHandler(QueueHandler):
+    """Queue handler that starts the background file writer on the first record."""
+    
+    def __init__(self, filename=LOG_FILE, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        super().__init__(queue.SimpleQueue())
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.listener = None
+    
+    def prepare(self, record):
+        # Records stay in this process, so the message is formatted by the listener thread instead.
+        return record
+    
+    def emit(self, record):
+        if self.listener is None:
+            file_handler = RotatingFileHandler(
+                self.filename, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+            )
+            file_handler.setFormatter(logging.Formatter(
+                "%(asctime)s - %(levelname)s - %(message)s",
+                datefmt="%Y-%m-%d %H:%M:%S",
+            ))
+            self.listener = QueueListener(self.queue, file_handler)
+            self.listener.start()
+            atexit.register(self.stop)
+        super().emit(record)
+    
+    def stop(self):
+        """Flush the queued records and stop the background writer."""
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
 
 logger = logging.getLogger("ExpenseTracker")
+logger.setLevel(os.environ.get("EXPENSE_TRACKER_LOG_LEVEL", LOG_LEVEL).upper())
+logger.propagate = False
+handler = BackgroundHandler()
+logger.addHandler(handler)
+
+_sample_counts = {}
+
+def log_sampled(level, msg, *args, every=LOG_SAMPLE_EVERY):
+    """Log one in `every` occurrences of the same message, with the number of occurrences so far."""
+    if not logger.isEnabledFor(level):
+        return
+    count = _sample_counts.get(msg, 0) + 1
+    _sample_counts[msg] = count
+    if every <= 1:
+        logger.log(level, msg, *args)
+    elif count % every == 1:
+        logger.log(level, msg + " (sampled, occurrence %d)", *args, count)
@@ -1,348 +1,292 @@
 # Main.py
 
-from db import ExpenseDB
-from config import CATEGORIES
-from datetime import datetime
-from utils import *
-from logger import logger
+# Only argparse is imported at module level so `main.py --help` starts fast.
+# The database, utils and logging modules are imported when a command runs, and
+# the interactive menu lives in menu.py so this script stays quick to compile.
 
-def main():
-    """Displays an interactive menu to access the program's functions."""
-    db = ExpenseDB()
+import argparse
+import os
+import sys
+
+def main(db_name="expenses.db"):
+    """Displays an interactive menu to access the program's functions (see menu.py)."""
+    from menu import main as menu
+    menu(db_name)
+
+class HelpFormatter(argparse.HelpFormatter):
+    """argparse's formatter with the terminal width read once, without importing shutil."""
     
-    while True:
-        print("\n --- Expense Tracker Menu ---")
-        print("1.- View all expenses.")
-        print("2.- Add a new expense.")
-        print("3.- Delete an expense.")
-        print("4.- Update an expense.")
-        print("5.- Search expenses by category.")
-        print("6.- Search expenses by a date range.")
-        print("7.- Export expenses to a CSV file.")
-        print("8.- Export expenses by category to a CSV file.")
-        print("9.- Export expenses by date range to a CSV file")
-        print("10.- Generate a report by category.")
-        print("11.- Generate a report by date range.")
-        print("12.- Exit the program.")
-        
-        opc = input("Select an option (1-12): ")
-        
-        if opc == "1":
-            print("\nOption 1: View all expenses.")
-            
-            order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
-            if order_choice not in ["asc", "desc"]:
-                order_choice = None
-                
-            expenses = db.get_expenses(order_by_amount=order_choice)
-            
-            if expenses: 
-                print_expenses(expenses)
-                logger.info(f"{len(expenses)} expenses displayed (order: {order_choice or 'none'}).")
-            else:
-                print("No expenses found.")
-                logger.warning("Attempt to view the expenses, but the expenses list is empty.")
-        
-        elif opc == "2":
-            print("\nOption 2: Add an expense.")
-            
-            date = input("Date (YYYY-MM-DD): ")
-            
-            print("\nAvailable Categories:")
-            for i, cat in enumerate(CATEGORIES, start=1):
-                print(f"{i}.{cat}")
-            
-            try:
-                category_choice = int(input("Please choose a category (number): "))
-                if 1 <= category_choice <= len(CATEGORIES):
-                    category = CATEGORIES[category_choice - 1]
-                else:
-                    print("Invalid Input. Operation canceled.")
-                    logger.warning(f"Invalid category: {category_choice}")
-                    continue
-            except ValueError:
-                print("Invalid Input: Please enter a valid number.")
-                logger.error("Error: Invalid input was entered.")
-                continue
-            
-            try: 
-                amount = float(input("Amount: "))
-                if amount < 0:
-                    print("A negative amount is not valid.")
-                    logger.error(f"Attempt to enter a negative amount: {amount}.")
-                    continue
-            except ValueError:
-                print("Invalid Input: Please enter a valid number.")
-                logger.error("Error: Invalid input was entered.")
-                continue
-            
-            note = input("Note (Optional / press Enter to skip): ")
-            
-            db.add_expense(date, category, amount, note)
-            print(f"Expense succesfully added to the category: {category}.")
-            logger.info(f"Expense added: Date={date}, Category={category}, Amount={amount:.2f}, Note={note}")
-        
-        elif opc == "3":
-            print("\nOption 3: Delete an expense.")
-            try:
-                expense_id = int(input("Enter the expense ID you want to delete: "))
-                confirm = input(f"Are you sure you want to delete the expense ID: {expense_id}? (y/n): ").lower()
-                if confirm != "y":
-                    print("Operation canceled")
-                    logger.info(f"User canceled the operation. (id={expense_id}).")
-                    continue
-                
-                db.delete_expense(expense_id)
-                
-            except ValueError:
-                print("Invalid Input: Please enter a valid number.")
-                logger.error("Error: Invalid input was entered.")
-                continue
-                
-        elif opc == "4":
-            print("\nOption 4: Update an expense.")
-            
+    terminal_width = None
+    
+    def __init__(self, prog, **kwargs):
+        if HelpFormatter.terminal_width is None:
             try:
-                expense_id = int(input("Enter the expense ID you want to update: "))
-            except ValueError:
-                print("Invalid Input: Please enter a valid number.")
-                logger.error("Error: Invalid input was entered.")
-                continue
-            
-            print("\nAvailable Categories:")
-            for i, cat in enumerate(CATEGORIES, start=1):
-                print(f"{i}.{cat}")
-                
-            category_choice = input("Please choose a new category (number or press Enter to skip):")
-            new_category = None
-            if category_choice.strip():
+                columns = int(os.environ["COLUMNS"])
+            except (KeyError, ValueError):
                 try:
-                    category_choice = int(category_choice)
-                    if 1 <= category_choice <= len(CATEGORIES):
-                        new_category = CATEGORIES[category_choice - 1]
-                    else:
-                        print("Invalid Input: Operation canceled.")
-                        logger.warning(f"Out of range category entered: {category_choice}.")
-                        continue
-                except ValueError:
-                    print("Invalid Input: Please enter a valid number.")
-                    logger.error("Error: Invalid input was entered.")
-                    continue
+                    columns = os.get_terminal_size(sys.__stdout__.fileno()).columns
+                except (AttributeError, ValueError, OSError):
+                    columns = 80
+            HelpFormatter.terminal_width = columns - 2
+        kwargs.setdefault("width", HelpFormatter.terminal_width)
+        super().__init__(prog, **kwargs)
 
-            new_amount = input("Please choose a new amount (press Enter to skip):")
-            amount_value = None
-            if new_amount.strip():
-                try:
-                    amount_value = float(new_amount)
-                    if amount_value < 0:
-                        print("A negative amount is not valid.")
-                        logger.error(f"Attempt to enter a negative amount: {amount_value}.")
-                        continue
-                except ValueError:
-                    print("Invalid input: Please enter a valid number")
-                    logger.error(f"Error: Invalid input was entered: {new_amount}.")
-                    continue
-            
-            new_note = input("New note (Optional / press Enter to skip): ")
+class ArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser using HelpFormatter. Subcommand parsers are created with the same class."""
+    
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("formatter_class", HelpFormatter)
+        super().__init__(*args, **kwargs)
+
+def build_parser():
+    """Build the argument parser for the non-interactive subcommands."""
+    parser = ArgumentParser(
+        prog="main.py",
+        description="Expense tracker. Run without a command to open the interactive menu.",
+    )
+    parser.add_argument("--db", default="expenses.db", help="Database file (default: expenses.db).")
+    parser.add_argument("--metrics-json", metavar="FILE", help="Time the command and save the statistics to FILE.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    
+    add = commands.add_parser("add", help="Add an expense.")
+    add.add_argument("date", help="Date (YYYY-MM-DD).")
+    add.add_argument("category", help="One of the categories in config.py.")
+    add.add_argument("amount")
+    add.add_argument("--note", default="")
+    
+    filters = ArgumentParser(add_help=False)
+    filters.add_argument("--category")
+    filters.add_argument("--start", help="Start date (YYYY-MM-DD), requires --end.")
+    filters.add_argument("--end", help="End date (YYYY-MM-DD), requires --start.")
+    filters.add_argument("--min", type=float, dest="min_amount", help="Minimum amount.")
+    filters.add_argument("--max", type=float, dest="max_amount", help="Maximum amount.")
+    filters.add_argument("--order", choices=["asc", "desc"], help="Sort by amount.")
+    filters.add_argument("--sort", type=lambda value: tuple(value.split(",")), metavar="KEYS",
+                         help="Comma-separated sort keys (id, date, category, amount), '-' prefix for descending, "
+                              "e.g. --sort=-amount,date.")
+    filters.add_argument("--limit", type=int, help="Return at most this many expenses (e.g. the top 10 with --order desc).")
+    
+    commands.add_parser("list", parents=[filters], help="List expenses.")
+    
+    export = commands.add_parser("export", parents=[filters], help="Export expenses to a CSV, JSON Lines or snapshot file.")
+    export.add_argument("filename", nargs="?", default="expenses.csv")
+    export.add_argument("--format", choices=["csv", "csv.gz", "jsonl", "jsonl.gz", "snapshot"],
+                        help="File format (default: from the file extension).")
+    export.add_argument("--partition", choices=["category", "month"],
+                        help="Write one file per category or month in a single scan (filters are not applied).")
+    export.add_argument("--dir", default=".", help="Directory for the partition files.")
+    export.add_argument("--gzip", action="store_true", help="Compress the partition files.")
+    export.add_argument("--workers", type=int, help="Threads writing the partition files.")
+    
+    report = commands.add_parser("report", help="Report by category, by date range, or a trend over time.")
+    report.add_argument("kind", choices=["category", "range", "trend"])
+    report.add_argument("start", nargs="?", help="Start date for a range or trend report.")
+    report.add_argument("end", nargs="?", help="End date for a range or trend report.")
+    report.add_argument("--period", choices=["day", "week", "month", "year"], default="month",
+                        help="Period of a trend report (default: month).")
+    report.add_argument("--by-category", action="store_true", help="Split a trend report by category.")
+    
+    import_csv = commands.add_parser("import", help="Import expenses from a CSV file.")
+    import_csv.add_argument("filename")
+    import_csv.add_argument("--reject-file", help="Where to write invalid rows.")
+    import_csv.add_argument("--on-duplicate", choices=["insert", "skip", "update"], default="insert",
+                            help="What to do with expenses already stored: insert them anyway (default), skip them, "
+                                 "or update the note of the stored one.")
+    
+    search = commands.add_parser("search", help="Search expenses by note (supports \"phrases\" and prefix*).")
+    search.add_argument("text")
+    search.add_argument("--category")
+    search.add_argument("--start", help="Start date (YYYY-MM-DD), requires --end.")
+    search.add_argument("--end", help="End date (YYYY-MM-DD), requires --start.")
+    search.add_argument("--page", type=int, default=1)
+    search.add_argument("--page-size", type=int, default=20)
+    
+    where = ArgumentParser(add_help=False)
+    where.add_argument("--category")
+    where.add_argument("--start", help="Start date (YYYY-MM-DD).")
+    where.add_argument("--end", help="End date (YYYY-MM-DD).")
+    where.add_argument("--min", type=float, dest="min_amount", help="Minimum amount.")
+    where.add_argument("--max", type=float, dest="max_amount", help="Maximum amount.")
+    where.add_argument("--note-contains", help="Text the note must contain.")
+    where.add_argument("--dry-run", action="store_true", help="Only count the matching expenses.")
+    
+    update_where = commands.add_parser("update-where", parents=[where], help="Update every expense matching the filters.")
+    update_where.add_argument("--set-date")
+    update_where.add_argument("--set-category")
+    update_where.add_argument("--set-amount", type=float)
+    update_where.add_argument("--set-note")
+    
+    commands.add_parser("delete-where", parents=[where], help="Delete every expense matching the filters.")
+    
+    archive = commands.add_parser("archive", help="Move a closed year to its own archive file, or list the archives.")
+    archive.add_argument("year", nargs="?", type=int, help="Year to archive (omit to list the archived years).")
+    archive.add_argument("--no-vacuum", action="store_true", help="Do not compact the main database afterwards.")
+    
+    backup = commands.add_parser("backup", help="Copy the database while it is in use.")
+    backup.add_argument("target")
+    backup.add_argument("--pages", type=int, help="Pages copied per step.")
+    
+    maintain = commands.add_parser("maintain", help="Reclaim free space and refresh the query planner statistics.")
+    maintain.add_argument("--max-seconds", type=float, help="Time budget of the run.")
+    
+    dedupe = commands.add_parser("dedupe", help="Find repeated expenses and delete the copies.")
+    dedupe.add_argument("--dry-run", action="store_true", help="Only list the copies.")
     
-            confirm = input("Are you sure you want to update the expense? (y/n): ").lower()
-            if confirm != "y":
-                print("Operation canceled.")
-                logger.info(f"User canceled the operation (id={expense_id}).")
-                continue
+    stats = commands.add_parser("stats", help="Show statistics saved with --metrics-json.")
+    stats.add_argument("filename")
     
-            db.update_expense(
-                expense_id,
-                category = new_category,
-                amount = amount_value,
-                note=new_note if new_note else None
-            )
-            
-            print("Processing operation...")
+    return parser
+
+def select_expenses(db, args):
+    """Return an iterator over the expenses matching the list/export filters."""
+    if args.start and not (args.category or args.min_amount or args.max_amount or args.sort or args.limit):
+        # A plain date range also reads the archived years.
+        return db.iter_expenses_between_dates(args.start, args.end, args.order)
+    if args.category and not (args.start or args.min_amount or args.max_amount or args.sort or args.limit):
+        # So does a plain category.
+        return db.iter_expenses_by_category(args.category, args.order)
+    order_by = args.sort or {"asc": ("amount",), "desc": ("-amount",)}.get(args.order, ())
+    return db.iter_query_expenses(args.category, args.start, args.end, args.min_amount, args.max_amount,
+                                  order_by, args.limit)
+
+def run_command(args, parser):
+    """Run one subcommand and return the process exit code."""
+    if args.command in ("list", "export", "search") and (args.start is None) != (args.end is None):
+        parser.error("--start and --end must be given together")
+    if args.command == "report" and args.kind == "range" and not (args.start and args.end):
+        parser.error("a range report needs a start and an end date")
+    if args.command == "report" and args.kind == "trend" and (args.start is None) != (args.end is None):
+        parser.error("a trend report needs both a start and an end date, or neither")
+    
+    if args.command == "add":
+        # The same checks as an imported CSV row.
+        from utils import parse_csv_row
+        expense, reason = parse_csv_row([args.date, args.category, args.amount, args.note])
+        if expense is None:
+            parser.error(reason)
+    
+    if args.command == "stats":
+        import json
+        from utils import print_metrics
+        with open(args.filename, encoding="utf-8") as file:
+            print_metrics(json.load(file))
+        return 0
+    
+    from db import ExpenseDB
+    db = ExpenseDB(args.db, instrument=True if args.metrics_json else None)
+    
+    try:
+        if args.command == "add":
+            if db.add_expense(*expense) is None:
+                return 1
         
-        elif opc == "5":
-            print("\nOption 5: Search expenses by category.")
-            
-            print("\nAvailable Categories:")
-            for i, cat in enumerate(CATEGORIES, start=1):
-                print(f"{i}.{cat}")
-                
-            try:
-                category_choice = int(input("Please choose a category you want to see (number):"))
-                if 1 <= category_choice <= len(CATEGORIES): 
-                    category = CATEGORIES[category_choice - 1]
-                    order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
-                    if order_choice not in ["asc", "desc"]:
-                        order_choice = None
-                    expenses = db.get_expenses_by_category(category, order_by_amount=order_choice)
-                    if expenses:
-                        print(f"\nExpenses in the cateogry: '{category}':")
-                        print_expenses(expenses)
-                        logger.info(f"{len(expenses)} expenses returned in the cateogry: {category}")
-                    else:
-                        print(f"No expenses found in the category: '{category}'.")
-                        logger.warning(f"No expenses found in the category: {category}.")
-                else:
-                    print("Invalid input: Operation canceled.")
-                    logger.warning(f"Out of range category entered: {category_choice}.")
-                    continue
-            except ValueError:
-                print("Invalid input: Please enter a valid number.")
-                logger.error("Error: Invalid input was entered.")
-                continue
-            
-        elif opc == "6":
-            print("Option 6: Search expenses by a date range.")
-            
-            start, end = None, None
-            try:
-                start = input("\nEnter the start date (YYYY-MM-DD): ")
-                end = input("Enter the end date (YYYY-MM-DD): ")
-                
-                datetime.strptime(start, "%Y-%m-%d")
-                datetime.strptime(end, "%Y-%m-%d")
-                
-                order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
-                if order_choice not in ["asc", "desc"]:
-                    order_choice = None
-                    
-                expense_range = db.get_expenses_between_dates(start, end, order_by_amount=order_choice)
-                
-                if expense_range:
-                    print(f"\nExpenses between {start} and {end}:")
-                    print_expenses(expense_range)
-                    logger.info(f"{len(expense_range)} expenses returned between {start} and {end}")
-                else:
-                    print(f"No expenses found between the dates: {start} and {end}")
-                    logger.warning(f"No expenses found between the dates: {start} and {end}")
-                        
-            except ValueError:
-                print("Invalid input: Please use the format YYYY-MM-DD.")
-                logger.error(f"Invalid date entered: start={start}, end={end}")
-                continue
-            
-        elif opc == "7":
-            print("\nOption 7: Export expenses to a CSV file.")
-            
-            filename = input("Enter the file name (press Enter to use 'expenses.csv'): ").strip()
-            if not filename:
-                filename = "expenses.csv"
-                
-            expenses = db.get_expenses()
-            export_to_csv(expenses, filename)
-            print(f"Expenses successfuly exported to '{filename}'.")
-            logger.info(f"Expenses exported to file: {filename}.")
-            
-        elif opc == "8":
-            print("\nOption 8: Export expenses by category to a CSV file.")
-            
-            print("\nAvailable Categories:")
-            for i, cat in enumerate(CATEGORIES, start=1):
-                print(f"{i}. {cat}")
-                
-            try:
-                choice = int(input("Please choose a category you want to export (number):"))
-                if 1 <= choice <= len(CATEGORIES): # 
-                    category = CATEGORIES[choice - 1]
-                    order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
-                    if order_choice not in ["asc", "desc"]:
-                        order_choice = None
-                        
-                    expenses = db.get_expenses_by_category(category, order_by_amount=order_choice)
-                    
-                    if expenses:
-                        filename = f"expenses_{category}.csv"
-                        export_to_csv(expenses, filename=filename)
-                        print(f"Expenses from category '{category} successfully exported to '{filename}'")
-                        logger.info(f"{len(expenses)} expenses exported in category: {category}, file: {filename}")
-                    else:
-                        print(f"No expenses found in the category {category}.")
-                        logger.warning(f"No expenses found to export in the category: {category}")
-                else:
-                    print("Invalid input: Operation canceled.")
-                    logger.warning(f"Out of range category entered: {choice}.")
-                    continue
-            except ValueError:
-                print("Invalid input: Please enter a valid number.")
-                logger.error("Error: Invalid input was entered.")
-                continue
+        elif args.command == "list":
+            from utils import print_expenses
+            print_expenses(select_expenses(db, args))
         
-        elif opc == "9":
-            print("\nOption 9: Export expenses by date range to a CSV file.")
-
-            start, end = None, None
-            try:
-                start = input("\nEnter the start date (YYYY-MM-DD): ")
-                end = input("Enter the end date (YYYY-MM-DD): ")
+        elif args.command == "export" and args.partition:
+            from config import EXPORT_WORKERS
+            from utils import export_partitioned
+            written = export_partitioned(db.iter_expenses_partitioned(args.partition), args.partition,
+                                         args.dir, args.gzip, args.workers or EXPORT_WORKERS)
+            if not written:
+                return 1
         
-                datetime.strptime(start, "%Y-%m-%d")
-                datetime.strptime(end, "%Y-%m-%d")
-                
-                order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
-                if order_choice not in ["asc", "desc"]:
-                    order_choice = None
-
-                expense_range = db.get_expenses_between_dates(start, end, order_by_amount=order_choice)
-                
-                if expense_range:
-                    filename = f"expenses_{start}_to_{end}.csv"
-                    export_to_csv(expense_range, filename=filename)
-                    print(f"Expenses between {start} and {end} successfully exported to '{filename}'")
-                    logger.info(f"{len(expense_range)} expenses exported between {start} and {end}, file: {filename}")
-                else:
-                    print(f"No expenses found between {start} and {end}.")
-                    logger.warning(f"No expenses found between {start} and {end}.")
-            except ValueError:
-                print("Invalid input: Please use the format YYYY-MM-DD.")
-                logger.error(f"Invalid date entered: start={start}, end={end}")
-                continue
-            
-        elif opc == "10":
-            print("\nOption 10: Generate a report by category.")
-            
-            report = db.get_report_category()
-            if report:
-                print_report_category(report)
-                logger.info("Category report successfully generated.")
-            else: 
-                print("No data available to generate a report.")
-                logger.warning("Attempt to generate a category report. No data available.")
+        elif args.command == "export":
+            from utils import export_expenses
+            if not export_expenses(select_expenses(db, args), args.filename, args.format):
+                return 1
         
-        elif opc == "11":
-            print("\nOption 11: Generate a report by date range.")
-            
-            start, end = None, None
-            try:
-                start = input("\nEnter the start date (YYYY-MM-DD): ")
-                end = input("Enter the end date (YYYY-MM-DD): ")
-                
-                datetime.strptime(start, "%Y-%m-%d")
-                datetime.strptime(end, "%Y-%m-%d")
-                
-                order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
-                if order_choice not in ["asc", "desc"]:
-                    order_choice = None
-                
-                report = db.get_report_by_date_range(start, end, order_by_amount=order_choice)
-                
-                if report and report[0]:
-                    print_report_date_range(report, start, end)
-                    logger.info(f"Date range report successfully generated: {start} to {end}, Total={report[0]:.2f}")
-                else:
-                    print(f"No data available to generate a report between {start} and {end}")
-                    logger.warning(f"No data available to generate a report: {start} to {end}")
-            except ValueError:
-                print("Invalid input: Please use the format YYYY-MM-DD.")
-                logger.error(f"Invalid date entered: start={start}, end={end}")
-                continue
-            
-        elif opc == "12":
-            print("\nExiting the program...")
-            logger.info("Program terminated by the user.")
-            break
-        else:
-            print("Invalid option: Please select a number between 1 and 12")
-            logger.warning("Invalid menu option selected.")
+        elif args.command == "report" and args.kind == "category":
+            from utils import print_report_category
+            print_report_category(db.get_report_category())
+        
+        elif args.command == "report" and args.kind == "trend":
+            from utils import print_report_trend
+            print_report_trend(db.get_report_trend(args.period, args.start, args.end, args.by_category), args.period)
+        
+        elif args.command == "report":
+            from utils import print_report_date_range
+            print_report_date_range(db.get_report_by_date_range(args.start, args.end), args.start, args.end)
+        
+        elif args.command == "search":
+            from utils import print_expenses
+            print_expenses(db.search_expenses(args.text, args.category, args.start, args.end, args.page, args.page_size))
+        
+        elif args.command in ("update-where", "delete-where"):
+            filters = {
+                "category": args.category,
+                "start_date": args.start,
+                "end_date": args.end,
+                "min_amount": args.min_amount,
+                "max_amount": args.max_amount,
+                "note_contains": args.note_contains,
+                "dry_run": args.dry_run,
+            }
+            if args.command == "update-where":
+                changes = {
+                    name: value
+                    for name, value in (("date", args.set_date), ("category", args.set_category),
+                                        ("amount", args.set_amount), ("note", args.set_note))
+                    if value is not None
+                }
+                count = db.update_expenses_where(changes, **filters)
+            else:
+                count = db.delete_expenses_where(**filters)
+            if count is None:
+                return 1
+            if args.dry_run:
+                print(f"{count} expenses match the filters.")
+        
+        elif args.command == "archive" and args.year is None:
+            for year, filename, count in db.get_archives():
+                print(f"{year}: {count} expenses in {filename}")
+        
+        elif args.command == "archive":
+            if not db.archive_year(args.year, vacuum=not args.no_vacuum):
+                return 1
+        
+        elif args.command == "backup":
+            from config import BACKUP_PAGES
+            if not db.backup(args.target, pages=args.pages or BACKUP_PAGES):
+                return 1
+        
+        elif args.command == "maintain":
+            from config import MAINTENANCE_MAX_SECONDS
+            if not db.run_maintenance(max_seconds=args.max_seconds or MAINTENANCE_MAX_SECONDS):
+                return 1
+        
+        elif args.command == "dedupe" and args.dry_run:
+            from utils import print_expenses
+            duplicates = db.find_duplicates()
+            if duplicates is None:
+                return 1
+            print_expenses(duplicates)
+            print(f"{len(duplicates)} duplicate expenses found.")
+        
+        elif args.command == "dedupe":
+            if db.delete_duplicates() is None:
+                return 1
+        
+        elif args.command == "import":
+            from utils import import_from_csv
+            if import_from_csv(db, args.filename, args.reject_file, on_duplicate=args.on_duplicate) is None:
+                return 1
+    finally:
+        db.close()
+        if args.metrics_json:
+            from metrics import metrics
+            metrics.dump_json(args.metrics_json)
+    return 0
+
+def cli(argv=None):
+    """Entry point: run a subcommand, or the interactive menu when none is given."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        main(args.db)
+        return 0
+    return run_command(args, parser)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(cli())
@@ -0,0 +1,651 @@
+# menu.py
+
+# Interactive menu of the expense tracker, opened by `python main.py` without a command.
+# It is kept out of main.py because Python compiles the script it runs on every start,
+# while an imported module is loaded from its cached bytecode.
+
+from datetime import datetime
+from config import CATEGORIES, PAGE_SIZE
+from db import ExpenseDB
+from logger import logger
+from utils import (print_expenses, print_expenses_page, export_to_csv, export_expenses, export_partitioned, import_from_csv,
+                   print_report_category, print_report_date_range, print_report_trend, print_metrics,
+                   print_cache_stats)
+
+def main(db_name="expenses.db"):
+    """Displays an interactive menu to access the program's functions."""
+    db = ExpenseDB(db_name)
+    
+    while True:
+        print("\n --- Expense Tracker Menu ---")
+        print("1.- View all expenses.")
+        print("2.- Add a new expense.")
+        print("3.- Delete an expense.")
+        print("4.- Update an expense.")
+        print("5.- Search expenses by category.")
+        print("6.- Search expenses by a date range.")
+        print("7.- Export expenses to a CSV file.")
+        print("8.- Export expenses by category to a CSV file.")
+        print("9.- Export expenses by date range to a CSV file")
+        print("10.- Generate a report by category.")
+        print("11.- Generate a report by date range.")
+        print("12.- Import expenses from a CSV file.")
+        print("13.- Verify the report rollups.")
+        print("14.- Show performance statistics.")
+        print("15.- Search expenses by note.")
+        print("16.- Generate a trend report (per day, week, month or year).")
+        print("17.- Update or delete expenses in bulk.")
+        print("18.- Archive a closed year.")
+        print("19.- Back up or compact the database.")
+        print("20.- Find and remove duplicate expenses.")
+        print("21.- Exit the program.")
+        
+        opc = input("Select an option (1-21): ")
+        
+        if opc == "1":
+            print("\nOption 1: View all expenses.")
+            
+            order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
+            if order_choice not in ["asc", "desc"]:
+                order_choice = None
+                
+            sort_key = "amount" if order_choice else "id"
+            descending = order_choice == "desc"
+            
+            page_size = input(f"Expenses per page (press Enter to use {PAGE_SIZE}): ").strip()
+            try:
+                page_size = int(page_size) if page_size else PAGE_SIZE
+                if page_size <= 0:
+                    raise ValueError
+            except ValueError:
+                print("Invalid Input: Please enter a valid number.")
+                logger.error("Error: Invalid page size was entered: %s.", page_size)
+                continue
+            
+            page = db.get_expenses_page(sort_key, descending, page_size=page_size)
+            if not page:
+                print("No expenses found.")
+                logger.warning("Attempt to view the expenses, but the expenses list is empty.")
+                continue
+            
+            if db.get_archives():
+                print("Archived years are not listed here: use option 6 with their dates to view them.")
+            
+            page_number = 1
+            while True:
+                print_expenses_page(page, page_number)
+                action = input("[n]ext page, [p]revious page, [q]uit: ").lower()
+                
+                if action == "n":
+                    new_page = db.get_expenses_page(sort_key, descending, after=page[-1], page_size=page_size)
+                    if new_page:
+                        page = new_page
+                        page_number += 1
+                    else:
+                        print("This is the last page.")
+                elif action == "p":
+                    new_page = db.get_expenses_page(sort_key, descending, before=page[0], page_size=page_size)
+                    if new_page:
+                        page = new_page
+                        page_number -= 1
+                    else:
+                        print("This is the first page.")
+                elif action == "q":
+                    break
+            
+            logger.info("%s pages of expenses displayed (order: %s, page size: %s).", page_number, order_choice or 'none', page_size)
+        
+        elif opc == "2":
+            print("\nOption 2: Add an expense.")
+            
+            date = input("Date (YYYY-MM-DD): ")
+            
+            print("\nAvailable Categories:")
+            for i, cat in enumerate(CATEGORIES, start=1):
+                print(f"{i}.{cat}")
+            
+            try:
+                category_choice = int(input("Please choose a category (number): "))
+                if 1 <= category_choice <= len(CATEGORIES):
+                    category = CATEGORIES[category_choice - 1]
+                else:
+                    print("Invalid Input. Operation canceled.")
+                    logger.warning("Invalid category: %s", category_choice)
+                    continue
+            except ValueError:
+                print("Invalid Input: Please enter a valid number.")
+                logger.error("Error: Invalid input was entered.")
+                continue
+            
+            try: 
+                amount = float(input("Amount: "))
+                if amount < 0:
+                    print("A negative amount is not valid.")
+                    logger.error("Attempt to enter a negative amount: %s.", amount)
+                    continue
+            except ValueError:
+                print("Invalid Input: Please enter a valid number.")
+                logger.error("Error: Invalid input was entered.")
+                continue
+            
+            note = input("Note (Optional / press Enter to skip): ")
+            
+            db.add_expense(date, category, amount, note)
+            print(f"Expense succesfully added to the category: {category}.")
+            logger.info("Expense added: Date=%s, Category=%s, Amount=%.2f, Note=%s", date, category, amount, note)
+        
+        elif opc == "3":
+            print("\nOption 3: Delete an expense.")
+            try:
+                expense_id = int(input("Enter the expense ID you want to delete: "))
+                confirm = input(f"Are you sure you want to delete the expense ID: {expense_id}? (y/n): ").lower()
+                if confirm != "y":
+                    print("Operation canceled")
+                    logger.info("User canceled the operation. (id=%s).", expense_id)
+                    continue
+                
+                db.delete_expense(expense_id)
+                
+            except ValueError:
+                print("Invalid Input: Please enter a valid number.")
+                logger.error("Error: Invalid input was entered.")
+                continue
+                
+        elif opc == "4":
+            print("\nOption 4: Update an expense.")
+            
+            try:
+                expense_id = int(input("Enter the expense ID you want to update: "))
+            except ValueError:
+                print("Invalid Input: Please enter a valid number.")
+                logger.error("Error: Invalid input was entered.")
+                continue
+            
+            print("\nAvailable Categories:")
+            for i, cat in enumerate(CATEGORIES, start=1):
+                print(f"{i}.{cat}")
+                
+            category_choice = input("Please choose a new category (number or press Enter to skip):")
+            new_category = None
+            if category_choice.strip():
+                try:
+                    category_choice = int(category_choice)
+                    if 1 <= category_choice <= len(CATEGORIES):
+                        new_category = CATEGORIES[category_choice - 1]
+                    else:
+                        print("Invalid Input: Operation canceled.")
+                        logger.warning("Out of range category entered: %s.", category_choice)
+                        continue
+                except ValueError:
+                    print("Invalid Input: Please enter a valid number.")
+                    logger.error("Error: Invalid input was entered.")
+                    continue
+
+            new_amount = input("Please choose a new amount (press Enter to skip):")
+            amount_value = None
+            if new_amount.strip():
+                try:
+                    amount_value = float(new_amount)
+                    if amount_value < 0:
+                        print("A negative amount is not valid.")
+                        logger.error("Attempt to enter a negative amount: %s.", amount_value)
+                        continue
+                except ValueError:
+                    print("Invalid input: Please enter a valid number")
+                    logger.error("Error: Invalid input was entered: %s.", new_amount)
+                    continue
+            
+            new_note = input("New note (Optional / press Enter to skip): ")
+    
+            confirm = input("Are you sure you want to update the expense? (y/n): ").lower()
+            if confirm != "y":
+                print("Operation canceled.")
+                logger.info("User canceled the operation (id=%s).", expense_id)
+                continue
+    
+            db.update_expense(
+                expense_id,
+                category = new_category,
+                amount = amount_value,
+                note=new_note if new_note else None
+            )
+            
+            print("Processing operation...")
+        
+        elif opc == "5":
+            print("\nOption 5: Search expenses by category.")
+            
+            print("\nAvailable Categories:")
+            for i, cat in enumerate(CATEGORIES, start=1):
+                print(f"{i}.{cat}")
+                
+            try:
+                category_choice = int(input("Please choose a category you want to see (number):"))
+                if 1 <= category_choice <= len(CATEGORIES): 
+                    category = CATEGORIES[category_choice - 1]
+                    order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
+                    if order_choice not in ["asc", "desc"]:
+                        order_choice = None
+                    expenses = db.get_expenses_by_category(category, order_by_amount=order_choice)
+                    if expenses:
+                        print(f"\nExpenses in the cateogry: '{category}':")
+                        print_expenses(expenses)
+                        logger.info("%s expenses returned in the cateogry: %s", len(expenses), category)
+                    else:
+                        print(f"No expenses found in the category: '{category}'.")
+                        logger.warning("No expenses found in the category: %s.", category)
+                else:
+                    print("Invalid input: Operation canceled.")
+                    logger.warning("Out of range category entered: %s.", category_choice)
+                    continue
+            except ValueError:
+                print("Invalid input: Please enter a valid number.")
+                logger.error("Error: Invalid input was entered.")
+                continue
+            
+        elif opc == "6":
+            print("Option 6: Search expenses by a date range.")
+            
+            start, end = None, None
+            try:
+                start = input("\nEnter the start date (YYYY-MM-DD): ")
+                end = input("Enter the end date (YYYY-MM-DD): ")
+                
+                datetime.strptime(start, "%Y-%m-%d")
+                datetime.strptime(end, "%Y-%m-%d")
+                
+                order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
+                if order_choice not in ["asc", "desc"]:
+                    order_choice = None
+                    
+                expense_range = db.get_expenses_between_dates(start, end, order_by_amount=order_choice)
+                
+                if expense_range:
+                    print(f"\nExpenses between {start} and {end}:")
+                    print_expenses(expense_range)
+                    logger.info("%s expenses returned between %s and %s", len(expense_range), start, end)
+                else:
+                    print(f"No expenses found between the dates: {start} and {end}")
+                    logger.warning("No expenses found between the dates: %s and %s", start, end)
+                        
+            except ValueError:
+                print("Invalid input: Please use the format YYYY-MM-DD.")
+                logger.error("Invalid date entered: start=%s, end=%s", start, end)
+                continue
+            
+        elif opc == "7":
+            print("\nOption 7: Export expenses to a CSV file.")
+            print("The format follows the extension: .csv, .csv.gz, .jsonl, .jsonl.gz or .snap (binary snapshot).")
+            
+            filename = input("Enter the file name (press Enter to use 'expenses.csv'): ").strip()
+            if not filename:
+                filename = "expenses.csv"
+                
+            if export_expenses(db.iter_expenses(), filename):
+                print(f"Expenses successfuly exported to '{filename}'.")
+                logger.info("Expenses exported to file: %s.", filename)
+            
+        elif opc == "8":
+            print("\nOption 8: Export expenses by category to a CSV file.")
+            
+            print("\nAvailable Categories:")
+            for i, cat in enumerate(CATEGORIES, start=1):
+                print(f"{i}. {cat}")
+                
+            try:
+                choice = int(input("Please choose a category you want to export (number, or 0 for every category in its own file):"))
+                if choice == 0:
+                    compress = input("Compress the files with gzip? (y/n): ").lower() == "y"
+                    export_partitioned(db.iter_expenses_partitioned("category"), "category", compress=compress)
+                elif 1 <= choice <= len(CATEGORIES): # 
+                    category = CATEGORIES[choice - 1]
+                    order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
+                    if order_choice not in ["asc", "desc"]:
+                        order_choice = None
+                        
+                    filename = f"expenses_{category}.csv"
+                    count = export_to_csv(db.iter_expenses_by_category(category, order_by_amount=order_choice), filename=filename)
+                    
+                    if count:
+                        print(f"Expenses from category '{category} successfully exported to '{filename}'")
+                        logger.info("%s expenses exported in category: %s, file: %s", count, category, filename)
+                    else:
+                        print(f"No expenses found in the category {category}.")
+                        logger.warning("No expenses found to export in the category: %s", category)
+                else:
+                    print("Invalid input: Operation canceled.")
+                    logger.warning("Out of range category entered: %s.", choice)
+                    continue
+            except ValueError:
+                print("Invalid input: Please enter a valid number.")
+                logger.error("Error: Invalid input was entered.")
+                continue
+        
+        elif opc == "9":
+            print("\nOption 9: Export expenses by date range to a CSV file.")
+
+            start, end = None, None
+            try:
+                start = input("\nEnter the start date (YYYY-MM-DD): ")
+                end = input("Enter the end date (YYYY-MM-DD): ")
+        
+                datetime.strptime(start, "%Y-%m-%d")
+                datetime.strptime(end, "%Y-%m-%d")
+                
+                order_choice = input("Sort the expenses by amount? (asc / desc / none): ").lower()
+                if order_choice not in ["asc", "desc"]:
+                    order_choice = None
+
+                filename = f"expenses_{start}_to_{end}.csv"
+                count = export_to_csv(db.iter_expenses_between_dates(start, end, order_by_amount=order_choice), filename=filename)
+                
+                if count:
+                    print(f"Expenses between {start} and {end} successfully exported to '{filename}'")
+                    logger.info("%s expenses exported between %s and %s, file: %s", count, start, end, filename)
+                else:
+                    print(f"No expenses found between {start} and {end}.")
+                    logger.warning("No expenses found between %s and %s.", start, end)
+            except ValueError:
+                print("Invalid input: Please use the format YYYY-MM-DD.")
+                logger.error("Invalid date entered: start=%s, end=%s", start, end)
+                continue
+            
+        elif opc == "10":
+            print("\nOption 10: Generate a report by category.")
+            
+            report = db.get_report_category()
+            if report:
+                print_report_category(report)
+                logger.info("Category report successfully generated.")
+            else: 
+                print("No data available to generate a report.")
+                logger.warning("Attempt to generate a category report. No data available.")
+        
+        elif opc == "11":
+            print("\nOption 11: Generate a report by date range.")
+            
+            start, end = None, None
+            try:
+                start = input("\nEnter the start date (YYYY-MM-DD): ")
+                end = input("Enter the end date (YYYY-MM-DD): ")
+                
+                datetime.strptime(start, "%Y-%m-%d")
+                datetime.strptime(end, "%Y-%m-%d")
+                
+                report = db.get_report_by_date_range(start, end)
+                
+                if report and report[0]:
+                    print_report_date_range(report, start, end)
+                    logger.info("Date range report successfully generated: %s to %s, Total=%.2f", start, end, report[0])
+                else:
+                    print(f"No data available to generate a report between {start} and {end}")
+                    logger.warning("No data available to generate a report: %s to %s", start, end)
+            except ValueError:
+                print("Invalid input: Please use the format YYYY-MM-DD.")
+                logger.error("Invalid date entered: start=%s, end=%s", start, end)
+                continue
+            
+        elif opc == "12":
+            print("\nOption 12: Import expenses from a CSV file.")
+            
+            filename = input("Enter the file name (press Enter to use 'expenses.csv'): ").strip()
+            if not filename:
+                filename = "expenses.csv"
+            
+            on_duplicate = input("Expenses already in the database (insert / skip / update, press Enter to insert): ").strip().lower()
+            if on_duplicate not in ["insert", "skip", "update"]:
+                on_duplicate = "insert"
+            
+            import_from_csv(db, filename, on_duplicate=on_duplicate)
+        
+        elif opc == "13":
+            print("\nOption 13: Verify the report rollups.")
+            
+            mismatches = db.verify_rollups()
+            if mismatches is None:
+                continue
+            if not mismatches:
+                print("Report rollups are consistent with the expenses table.")
+                continue
+            
+            print(f"{len(mismatches)} rollup rows do not match the expenses table.")
+            confirm = input("Rebuild the rollups now? (y/n): ").lower()
+            if confirm == "y":
+                db.rebuild_rollups()
+            else:
+                print("Operation canceled.")
+                logger.info("User canceled the rollup rebuild.")
+        
+        elif opc == "14":
+            print("\nOption 14: Show performance statistics.")
+            
+            print_cache_stats(db.cache_stats())
+            
+            from metrics import metrics
+            if not metrics.enabled:
+                print("\nTiming statistics are disabled. Set METRICS_ENABLED in config.py or EXPENSE_TRACKER_METRICS=1.")
+                continue
+            
+            print_metrics(metrics.snapshot())
+            filename = input("Save the statistics as JSON? Enter a file name (or press Enter to skip): ").strip()
+            if filename:
+                metrics.dump_json(filename)
+                print(f"Statistics saved to '{filename}'.")
+                logger.info("Performance statistics saved to %s", filename)
+        
+        elif opc == "15":
+            print("\nOption 15: Search expenses by note.")
+            print('Use "quoted phrases" for exact matches and a trailing * for prefixes (e.g. coff*).')
+            if db.get_archives():
+                print("Archived years are not searched: use option 6 with their dates to view them.")
+            
+            text = input("Search: ").strip()
+            if not text:
+                print("Operation canceled.")
+                continue
+            
+            print("\nAvailable Categories:")
+            for i, cat in enumerate(CATEGORIES, start=1):
+                print(f"{i}.{cat}")
+            category_choice = input("Filter by category (number or press Enter to skip): ").strip()
+            category = None
+            if category_choice:
+                try:
+                    category_choice = int(category_choice)
+                    if not 1 <= category_choice <= len(CATEGORIES):
+                        raise ValueError
+                    category = CATEGORIES[category_choice - 1]
+                except ValueError:
+                    print("Invalid Input: Operation canceled.")
+                    logger.warning("Invalid category entered in search: %s.", category_choice)
+                    continue
+            
+            start = input("Start date (YYYY-MM-DD or press Enter to skip): ").strip()
+            end = None
+            if start:
+                end = input("End date (YYYY-MM-DD): ").strip()
+                try:
+                    datetime.strptime(start, "%Y-%m-%d")
+                    datetime.strptime(end, "%Y-%m-%d")
+                except ValueError:
+                    print("Invalid input: Please use the format YYYY-MM-DD.")
+                    logger.error("Invalid date entered: start=%s, end=%s", start, end)
+                    continue
+            
+            page_number = 1
+            while True:
+                results = db.search_expenses(text, category, start or None, end, page=page_number)
+                if not results:
+                    print("No matching expenses found." if page_number == 1 else "This is the last page.")
+                    if page_number == 1:
+                        break
+                    page_number -= 1
+                    continue
+                
+                print_expenses_page(results, page_number)
+                action = input("[n]ext page, [p]revious page, [q]uit: ").lower()
+                if action == "n":
+                    page_number += 1
+                elif action == "p" and page_number > 1:
+                    page_number -= 1
+                elif action == "q":
+                    break
+            logger.info("Search for '%s' (category: %s, dates: %s to %s).", text, category, start, end)
+        
+        elif opc == "16":
+            print("\nOption 16: Generate a trend report.")
+            
+            period = input("Group by (day / week / month / year, press Enter for month): ").strip().lower() or "month"
+            if period not in ("day", "week", "month", "year"):
+                print("Invalid input: Operation canceled.")
+                logger.warning("Invalid trend period entered: %s.", period)
+                continue
+            
+            start = input("Start date (YYYY-MM-DD or press Enter for all dates): ").strip()
+            end = None
+            if start:
+                end = input("End date (YYYY-MM-DD): ").strip()
+                try:
+                    datetime.strptime(start, "%Y-%m-%d")
+                    datetime.strptime(end, "%Y-%m-%d")
+                except ValueError:
+                    print("Invalid input: Please use the format YYYY-MM-DD.")
+                    logger.error("Invalid date entered: start=%s, end=%s", start, end)
+                    continue
+            
+            by_category = input("Split by category? (y/n): ").lower() == "y"
+            report = db.get_report_trend(period, start or None, end, by_category)
+            print_report_trend(report, period)
+            logger.info("Trend report generated by %s (%s rows).", period, len(report))
+        
+        elif opc == "17":
+            print("\nOption 17: Update or delete expenses in bulk.")
+            
+            action = input("Action (update / delete): ").strip().lower()
+            if action not in ("update", "delete"):
+                print("Invalid input: Operation canceled.")
+                logger.warning("Invalid bulk action entered: %s.", action)
+                continue
+            
+            print("\nChoose the expenses to change (press Enter to skip a filter).")
+            print("\nAvailable Categories:")
+            for i, cat in enumerate(CATEGORIES, start=1):
+                print(f"{i}.{cat}")
+            category_choice = input("Category (number): ").strip()
+            start = input("Start date (YYYY-MM-DD): ").strip()
+            end = input("End date (YYYY-MM-DD): ").strip() if start else ""
+            note_contains = input("Note contains: ").strip()
+            try:
+                category = CATEGORIES[int(category_choice) - 1] if category_choice else None
+                if category_choice and int(category_choice) < 1:
+                    raise IndexError
+                if start:
+                    datetime.strptime(start, "%Y-%m-%d")
+                    datetime.strptime(end, "%Y-%m-%d")
+            except (ValueError, IndexError):
+                print("Invalid input: Operation canceled.")
+                logger.warning("Invalid bulk filter entered: category=%s, start=%s, end=%s", category_choice, start, end)
+                continue
+            
+            filters = {
+                "category": category,
+                "start_date": start or None,
+                "end_date": end or None,
+                "note_contains": note_contains or None,
+            }
+            
+            changes = {}
+            if action == "update":
+                new_category = input("New category (number, press Enter to keep): ").strip()
+                new_note = input("New note (press Enter to keep): ").strip()
+                try:
+                    if new_category:
+                        if int(new_category) < 1:
+                            raise IndexError
+                        changes["category"] = CATEGORIES[int(new_category) - 1]
+                except (ValueError, IndexError):
+                    print("Invalid input: Operation canceled.")
+                    logger.warning("Invalid category entered: %s.", new_category)
+                    continue
+                if new_note:
+                    changes["note"] = new_note
+                if not changes:
+                    print("No data available to update.")
+                    continue
+                count = db.update_expenses_where(changes, dry_run=True, **filters)
+            else:
+                count = db.delete_expenses_where(dry_run=True, **filters)
+            
+            if not count:
+                if count == 0:
+                    print("No expenses match the filters.")
+                continue
+            
+            confirmation = input(f"{count} expenses will be {action}d. Continue? (y/n): ").lower()
+            if confirmation != "y":
+                print("Operation canceled.")
+                continue
+            
+            if action == "update":
+                db.update_expenses_where(changes, **filters)
+            else:
+                db.delete_expenses_where(**filters)
+        
+        elif opc == "18":
+            print("\nOption 18: Archive a closed year.")
+            
+            archives = db.get_archives()
+            if archives:
+                print("\nArchived years:")
+                for year, filename, count in archives:
+                    print(f"{year}: {count} expenses in {filename}")
+            
+            year = input("Year to move to its own archive file (press Enter to cancel): ").strip()
+            if not year:
+                print("Operation canceled.")
+                continue
+            if not (year.isdigit() and len(year) == 4):
+                print("Invalid input: Please enter a year as YYYY.")
+                logger.warning("Invalid year entered for archiving: %s.", year)
+                continue
+            db.archive_year(int(year))
+        
+        elif opc == "19":
+            print("\nOption 19: Back up or compact the database.")
+            
+            action = input("Action (backup / compact): ").strip().lower()
+            if action == "backup":
+                target = input("Backup file name (press Enter to use 'expenses_backup.db'): ").strip()
+                db.backup(target or "expenses_backup.db")
+            elif action == "compact":
+                db.run_maintenance()
+            else:
+                print("Invalid input: Operation canceled.")
+                logger.warning("Invalid maintenance action entered: %s.", action)
+        
+        elif opc == "20":
+            print("\nOption 20: Find and remove duplicate expenses.")
+            if db.get_archives():
+                print("Archived years are not checked for duplicates.")
+            
+            duplicates = db.find_duplicates()
+            if not duplicates:
+                if duplicates is not None:
+                    print("No duplicate expenses found.")
+                continue
+            
+            print("\nCopies of an earlier expense (same date, category, amount and note):")
+            print_expenses(duplicates)
+            confirmation = input(f"{len(duplicates)} duplicate expenses will be deleted, keeping the first of each. Continue? (y/n): ").lower()
+            if confirmation != "y":
+                print("Operation canceled.")
+                continue
+            db.delete_duplicates()
+        
+        elif opc == "21":
+            print("\nExiting the program...")
+            logger.info("Program terminated by the user.")
+            break
+        else:
+            print("Invalid option: Please select a number between 1 and 21")
+            logger.warning("Invalid menu option selected.")
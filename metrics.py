@@ -0,0 +1,236 @@
+# metrics.py
+
+# Lightweight timing for ExpenseDB. When enabled, every public ExpenseDB method
+# and every SQL statement records its call count, rows returned and a latency
+# histogram (p50/p95/p99). When disabled nothing is wrapped, so there is no
+# overhead at all.
+
+import bisect
+import functools
+import inspect
+import json
+import sqlite3
+import threading
+import time
+from config import SLOW_QUERY_MS
+from logger import logger
+
+# Histogram bucket upper bounds in seconds: from 1 microsecond to ~100 s, 20% apart.
+BUCKETS = [1e-6 * 1.2 ** i for i in range(102)]
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Add one latency sample."""
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Return the upper bound of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(BUCKETS[index] if index < len(BUCKETS) else self.max, self.max)
+        return self.max
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.rows = {}
+
+    def record(self, name, seconds, rows=None):
+        """Record one call of `name` that took `seconds` and returned `rows` rows."""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+                self.rows[name] = 0
+            histogram.record(seconds)
+            if rows:
+                self.rows[name] += rows
+
+    def snapshot(self):
+        """Return the statistics as a dict: name -> calls, rows, total and percentile latencies in ms."""
+        with self.lock:
+            return {
+                name: {
+                    "calls": histogram.count,
+                    "rows": self.rows[name],
+                    "total_ms": round(histogram.total * 1000, 3),
+                    "p50_ms": round(histogram.percentile(0.50) * 1000, 3),
+                    "p95_ms": round(histogram.percentile(0.95) * 1000, 3),
+                    "p99_ms": round(histogram.percentile(0.99) * 1000, 3),
+                    "max_ms": round(histogram.max * 1000, 3),
+                }
+                for name, histogram in sorted(self.histograms.items())
+            }
+
+    def dump_json(self, filename):
+        """Write the statistics to a JSON file."""
+        with open(filename, mode="w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+    def reset(self):
+        """Forget every recorded sample."""
+        with self.lock:
+            self.histograms.clear()
+            self.rows.clear()
+
+metrics = Metrics()
+
+def _count_rows(result):
+    """Return the number of rows in a method result, if it is a list of rows."""
+    return len(result) if isinstance(result, list) else None
+
+def _timed_method(name, method):
+    """Wrap a method so each call is recorded under `name`."""
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_wrapper(*args, **kwargs):
+            # Generators are timed over their whole consumption.
+            started = time.perf_counter()
+            rows = 0
+            try:
+                for row in method(*args, **kwargs):
+                    rows += 1
+                    yield row
+            finally:
+                metrics.record(name, time.perf_counter() - started, rows)
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        result = method(*args, **kwargs)
+        metrics.record(name, time.perf_counter() - started, _count_rows(result))
+        return result
+    return wrapper
+
+def instrument(obj, prefix):
+    """Replace the public methods of `obj` with timed wrappers on the instance."""
+    metrics.enabled = True
+    for name, method in inspect.getmembers(obj, inspect.ismethod):
+        if not name.startswith("_"):
+            setattr(obj, name, _timed_method(f"{prefix}.{name}", method))
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that times a statement from execute until its rows are fetched, and counts the rows.
+    
+    The statement is recorded when the last row has been fetched, or when the cursor is closed or
+    dropped before that (for instance by a LIMIT applied with islice).
+    """
+
+    _statement = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._start(sql, parameters)
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._seconds += time.perf_counter() - started
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        self._start(sql, None)
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._seconds += time.perf_counter() - started
+        self._finish()
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            # The interpreter may be shutting down; losing one sample is fine.
+            pass
+
+    def _start(self, sql, parameters):
+        self._statement = (sql, parameters)
+        self._seconds = 0.0
+        self._rows = 0
+
+    def _fetched(self, started, rows, done):
+        if self._statement is None:
+            return
+        self._seconds += time.perf_counter() - started
+        self._rows += rows
+        if done:
+            self._finish()
+
+    def _finish(self):
+        """Record the current statement once."""
+        if self._statement is None:
+            return
+        (sql, parameters), self._statement = self._statement, None
+        statement = " ".join(sql.split())
+        metrics.record(f"sql: {statement[:120]}", self._seconds, self._rows)
+
+        if self._seconds * 1000 >= SLOW_QUERY_MS and statement.upper().startswith("SELECT") and parameters is not None:
+            try:
+                plan = sqlite3.Connection.execute(self.connection, f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+            except sqlite3.Error:
+                return
+            logger.warning("Slow query (%.1f ms, %s rows): %s | plan: %s", self._seconds * 1000, self._rows, statement,
+                           " | ".join(row[3] for row in plan))
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors time each statement through the fetching of its rows, and log slow SELECTs
+    with their query plan."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
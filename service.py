@@ -0,0 +1,226 @@
+# service.py
+
+# Local HTTP/JSON service over ExpenseDB, so dashboards and scripts can query
+# the same database while the menu is in use.
+#
+#   python service.py [--db expenses.db] [--port 8765]
+#
+# Endpoints (GET):
+#   /expenses?category=Food&start=2025-01-01&end=2025-01-31&min=10&max=50&order=desc&limit=10   (streamed)
+#   /reports/category
+#   /reports/date-range?start=2025-01-01&end=2025-01-31
+#   /search?q=coffee*&category=Food&start=2025-01-01&end=2025-01-31&page=1
+#   /stats   (performance statistics when metrics are enabled, and the last maintenance report)
+#
+# The database maintenance (see ExpenseDB.run_maintenance) runs every MAINTENANCE_INTERVAL seconds.
+
+import argparse
+import asyncio
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from config import FETCH_SIZE, SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_MAX_REQUESTS, SERVICE_MAX_STREAMS
+from config import MAINTENANCE_INTERVAL
+from db import ExpenseDB
+from logger import logger
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+class ExpenseService:
+    def __init__(self, db, workers=SERVICE_WORKERS, max_requests=SERVICE_MAX_REQUESTS, max_streams=SERVICE_MAX_STREAMS):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="expense-db")
+        self.requests = asyncio.Semaphore(max_requests)
+        # A stream holds a pooled read connection between chunks. The pool has one connection per
+        # worker thread plus one per stream, so a thread never waits for a connection held by a
+        # stream that itself needs a thread to go on.
+        self.streams = asyncio.Semaphore(max_streams)
+        self.last_maintenance = None
+        self.routes = {
+            "/expenses": self.list_expenses,
+            "/reports/category": self.report_category,
+            "/reports/date-range": self.report_date_range,
+            "/search": self.search,
+            "/stats": self.stats,
+        }
+
+    async def run_db(self, function, *args):
+        """Run a blocking ExpenseDB call in the bounded executor."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def handle(self, reader, writer):
+        """Serve one HTTP request per connection."""
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) != 3:
+                return
+
+            method, target, _ = parts
+            url = urlsplit(target)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            route = self.routes.get(url.path)
+
+            async with self.requests:
+                if route is None:
+                    await self.send_json(writer, 404, {"error": f"unknown path: {url.path}"})
+                elif method != "GET":
+                    await self.send_json(writer, 405, {"error": "only GET is supported"})
+                else:
+                    await route(writer, query)
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error("Error in ExpenseService.handle: %s", e)
+            try:
+                await self.send_json(writer, 500, {"error": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def send_json(self, writer, status, payload):
+        """Send a complete JSON response."""
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def list_expenses(self, writer, query):
+        """Stream the matching expenses as a chunked JSON array, at most max_streams at a time."""
+        category, start, end = query.get("category"), query.get("start"), query.get("end")
+        order_by = {"asc": ("amount",), "desc": ("-amount",)}.get(query.get("order"), ())
+        if (start is None) != (end is None):
+            await self.send_json(writer, 400, {"error": "start and end must be given together"})
+            return
+        try:
+            min_amount = float(query["min"]) if "min" in query else None
+            max_amount = float(query["max"]) if "max" in query else None
+            limit = int(query["limit"]) if "limit" in query else None
+        except ValueError:
+            await self.send_json(writer, 400, {"error": "min, max and limit must be numbers"})
+            return
+
+        # The stream keeps its read connection until the last chunk is sent.
+        async with self.streams:
+            if start and not (category or min_amount is not None or max_amount is not None or limit is not None):
+                # A plain date range also reads the archived years.
+                rows = self.db.iter_expenses_between_dates(start, end, query.get("order"))
+            elif category and not (start or min_amount is not None or max_amount is not None or limit is not None):
+                # So does a plain category.
+                rows = self.db.iter_expenses_by_category(category, query.get("order"))
+            else:
+                rows = self.db.iter_query_expenses(category, start, end, min_amount, max_amount, order_by, limit)
+
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n"
+            )
+            first = True
+            try:
+                while True:
+                    chunk = await self.run_db(lambda: list(itertools.islice(rows, FETCH_SIZE)))
+                    if not chunk:
+                        break
+                    items = ",".join(
+                        json.dumps({"id": r[0], "date": r[1], "category": r[2], "amount": r[3], "note": r[4]})
+                        for r in chunk
+                    )
+                    data = ("[" if first else ",") + items
+                    first = False
+                    writer.write(f"{len(data.encode()):x}\r\n".encode() + data.encode() + b"\r\n")
+                    await writer.drain()
+            finally:
+                # Release the pooled read connection even if the client went away.
+                await self.run_db(rows.close)
+
+            tail = b"[]" if first else b"]"
+            writer.write(f"{len(tail):x}\r\n".encode() + tail + b"\r\n0\r\n\r\n")
+            await writer.drain()
+
+    async def report_category(self, writer, query):
+        """Return the category report."""
+        report = await self.run_db(self.db.get_report_category)
+        await self.send_json(writer, 200, [{"category": c, "total": t} for c, t in report])
+
+    async def report_date_range(self, writer, query):
+        """Return the total, count and average between two dates."""
+        start, end = query.get("start"), query.get("end")
+        if not start or not end:
+            await self.send_json(writer, 400, {"error": "start and end are required"})
+            return
+        total, count, average = await self.run_db(self.db.get_report_by_date_range, start, end) or (None, 0, None)
+        await self.send_json(writer, 200, {"start": start, "end": end, "total": total, "count": count, "average": average})
+
+    async def search(self, writer, query):
+        """Return one page of ranked full-text search results over the notes."""
+        text = query.get("q", "")
+        try:
+            page = max(1, int(query.get("page", 1)))
+        except ValueError:
+            await self.send_json(writer, 400, {"error": "page must be a number"})
+            return
+        rows = await self.run_db(self.db.search_expenses, text, query.get("category"),
+                                 query.get("start"), query.get("end"), page)
+        await self.send_json(writer, 200, [
+            {"id": r[0], "date": r[1], "category": r[2], "amount": r[3], "note": r[4]} for r in rows
+        ])
+
+    async def run_maintenance(self, interval=MAINTENANCE_INTERVAL):
+        """Run the database maintenance every `interval` seconds, in the executor like any request."""
+        while True:
+            await asyncio.sleep(interval)
+            report = await self.run_db(self.db.run_maintenance)
+            self.last_maintenance = report
+    
+    async def stats(self, writer, query):
+        """Return the performance statistics collected by metrics.py."""
+        from metrics import metrics
+        await self.send_json(writer, 200, {
+            "enabled": metrics.enabled,
+            "stats": metrics.snapshot(),
+            "cache": self.db.cache_stats(),
+            "maintenance": self.last_maintenance,
+        })
+
+async def serve(db_name, host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS, max_requests=SERVICE_MAX_REQUESTS,
+                max_streams=SERVICE_MAX_STREAMS):
+    """Start the service and run until cancelled."""
+    db = ExpenseDB(db_name, pooled=True, pool_size=workers + max_streams)
+    service = ExpenseService(db, workers, max_requests, max_streams)
+    server = await asyncio.start_server(service.handle, host, port)
+    maintenance = asyncio.create_task(service.run_maintenance())
+    print(f"Expense service listening on http://{host}:{port}")
+    logger.info("Expense service started on %s:%s (db=%s, workers=%s)", host, port, db_name, workers)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        maintenance.cancel()
+        service.executor.shutdown(wait=True)
+        db.close()
+        logger.info("Expense service stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON service over the expenses database.")
+    parser.add_argument("--db", default="expenses.db")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--max-requests", type=int, default=SERVICE_MAX_REQUESTS)
+    parser.add_argument("--max-streams", type=int, default=SERVICE_MAX_STREAMS)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.workers, args.max_requests, args.max_streams))
+    except KeyboardInterrupt:
+        print("\nService stopped.")
+
+if __name__ == "__main__":
+    main()
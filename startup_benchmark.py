@@ -0,0 +1,50 @@
+# startup_benchmark.py
+
+# Measures the cold-start time of `python main.py --help` and fails when its
+# median cost over a bare `python -c pass` goes over the budget, so slow
+# imports don't creep back into startup. The interpreter's own start-up is
+# taken out because it depends on the machine, not on this project.
+#
+#   python startup_benchmark.py [--runs 20] [--budget-ms 50]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Milliseconds main.py --help may add on top of the bare interpreter.
+STARTUP_BUDGET_MS = 50
+
+def time_command(command, runs):
+    """Run a command `runs` times and return the wall times in milliseconds."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the cold-start budget of main.py --help.")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args()
+
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    interpreter = statistics.median(time_command([sys.executable, "-c", "pass"], args.runs))
+    startup = statistics.median(time_command([sys.executable, main_py, "--help"], args.runs))
+
+    print(f"Interpreter alone:      {interpreter:.1f} ms")
+    print(f"main.py --help:         {startup:.1f} ms")
+    print(f"Cost of main.py itself: {startup - interpreter:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    if startup - interpreter > args.budget_ms:
+        print("FAILED: startup is over budget.")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
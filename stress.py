@@ -0,0 +1,93 @@
+# stress.py
+
+# Runs several reader threads (reports and listings) against a pooled ExpenseDB
+# while a writer thread bulk-inserts expenses, then checks that nothing failed
+# and that the report rollups still match the expenses table.
+#
+#   python stress.py --readers 4 --rows 200000
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from config import CATEGORIES
+from db import ExpenseDB
+
+def generate_expenses(count, seed):
+    """Yield random (date, category, amount, note) tuples."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield (f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", rng.choice(CATEGORIES),
+               round(rng.uniform(1, 500), 2), f"stress {i}")
+
+def writer(db, rows, batch_size, errors):
+    """Bulk-insert rows in several calls so readers see the table grow."""
+    try:
+        for seed in range(0, rows, batch_size * 10):
+            summary = db.add_expenses_many(generate_expenses(min(batch_size * 10, rows - seed), seed), batch_size)
+            if summary["error"]:
+                errors.append(f"writer: {summary['error']}")
+            if summary["rejected"]:
+                errors.append(f"writer: {summary['rejected']} rows rejected")
+    except Exception as e:
+        errors.append(f"writer: {e}")
+
+def reader(db, stop, counts, errors):
+    """Run reports and listings until the writer is done."""
+    rng = random.Random(threading.get_ident())
+    try:
+        while not stop.is_set():
+            month = rng.randint(1, 12)
+            start, end = f"2025-{month:02d}-01", f"2025-{month:02d}-28"
+            db.get_report_category()
+            db.get_report_by_date_range(start, end)
+            sum(1 for _ in db.iter_expenses_between_dates(start, end))
+            counts[threading.get_ident()] = counts.get(threading.get_ident(), 0) + 1
+    except Exception as e:
+        errors.append(f"reader: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent readers and a bulk writer on a pooled ExpenseDB.")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = ExpenseDB(os.path.join(directory, "stress.db"), pooled=True, pool_size=args.readers)
+        stop = threading.Event()
+        counts, errors = {}, []
+
+        readers = [threading.Thread(target=reader, args=(db, stop, counts, errors)) for _ in range(args.readers)]
+        write_thread = threading.Thread(target=writer, args=(db, args.rows, args.batch_size, errors))
+
+        started = time.perf_counter()
+        for thread in readers:
+            thread.start()
+        write_thread.start()
+        write_thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+        mismatches = db.verify_rollups()
+        total = db.get_report_by_date_range("2025-01-01", "2025-12-31")[1]
+        db.close()
+
+    print(f"Inserted {total} rows in {elapsed:.2f}s ({total / elapsed:,.0f} rows/s).")
+    print(f"Reader iterations: {sum(counts.values())} across {len(counts)} threads.")
+    if total != args.rows:
+        errors.append(f"expected {args.rows} rows, found {total}")
+    if mismatches:
+        errors.append(f"{len(mismatches)} rollup mismatches")
+
+    for error in errors:
+        print("ERROR:", error)
+    print("FAILED" if errors else "OK")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
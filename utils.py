@@ -1,39 +1,300 @@
 # utils.py
 
+import array
 import csv
+import gzip
+import io
+import itertools
+import json
+import math
+import os
+import queue
+import shutil
+import struct
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as Date
+from config import CATEGORIES, BATCH_SIZE, PROGRESS_EVERY, FETCH_SIZE, EXPORT_WORKERS, EXPORT_QUEUE_CHUNKS
 from logger import logger
 
+CATEGORY_SET = set(CATEGORIES)
+
+# Partition key of an expense row for the partitioned export.
+PARTITION_KEYS = {
+    "category": lambda exp: exp[2],
+    "month": lambda exp: exp[1][:7],
+}
+
 def print_expenses(expenses):
-    """Display all the expenses in a user-friendly tabular format."""
-    if not expenses:
+    """Display the expenses (a list or any iterable) in a user-friendly tabular format. Returns the number of rows shown."""
+    expenses = iter(expenses)
+    first = next(expenses, None)
+    if first is None:
         print("No expenses to display.")
-        return
+        return 0
 
     print(f"{'ID':<5} {'Date':<12} {'Category':<15} {'Amount':<10} {'Note'}")
     print("-" * 60)
     
-    for exp in expenses:
+    count = 0
+    for exp in itertools.chain((first,), expenses):
         print(f"{exp[0]:<5} {exp[1]:<12} {exp[2]:<15} {exp[3]:<10.2f} {exp[4] or ''}")
+        count += 1
+    return count
     
-def export_to_csv(expenses, filename="expenses.csv"):
-    """Export a list of expenses to a CSV file."""
+def format_expenses(expenses):
+    """Return the expenses as a tabular string, in the same format as print_expenses."""
+    lines = [f"{'ID':<5} {'Date':<12} {'Category':<15} {'Amount':<10} {'Note'}", "-" * 60]
+    lines.extend(f"{exp[0]:<5} {exp[1]:<12} {exp[2]:<15} {exp[3]:<10.2f} {exp[4] or ''}" for exp in expenses)
+    return "\n".join(lines) + "\n"
+
+def print_expenses_page(expenses, page_number):
+    """Display one page of expenses with a single buffered write."""
+    sys.stdout.write(f"\nPage {page_number}\n" + format_expenses(expenses))
+    sys.stdout.flush()
+
+def _open_text(filename, compress=None):
+    """Open a text file for writing, gzip-compressed if `compress` is set or the name ends in .gz."""
+    if compress is None:
+        compress = filename.endswith(".gz")
+    if compress:
+        return io.TextIOWrapper(gzip.open(filename, mode="wb", compresslevel=6), newline="", encoding="utf-8")
+    return open(filename, mode="w", newline="", encoding="utf-8")
+
+def _export(expenses, filename, write_rows, name):
+    """Run a streaming exporter over the expenses, with the shared empty/success/error handling."""
     try:
-        if not expenses:
+        expenses = iter(expenses)
+        first = next(expenses, None)
+        if first is None:
             print("No expense to export.")
             logger.warning("Attempt to export expenses. No data available.")
-            return
-        with open(filename, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(["ID", "Date", "Category", "Amount", "Note"])
-            for exp in expenses:
-                writer.writerow(exp)
-                
+            return 0
+        
+        count = write_rows(itertools.chain((first,), expenses), filename)
         print(f"Expenses successfully exported. File saved as: {filename}.")
-        logger.info(f"{len(expenses)} expenses exported to {filename}")
+        logger.info("%s expenses exported to %s", count, filename)
+        return count
     
     except Exception as e:
         print(f"Error exporting expenses: {e}")
-        logger.error(f"Error in export_to_csv: {filename}: {e}")
+        logger.error("Error in %s: %s: %s", name, filename, e)
+        return 0
+
+def _write_csv(expenses, filename, compress=None):
+    """Write the expenses as CSV in chunks of FETCH_SIZE rows. Returns the number of rows."""
+    count = 0
+    with _open_text(filename, compress) as file:
+        writer = csv.writer(file)
+        writer.writerow(["ID", "Date", "Category", "Amount", "Note"])
+        for chunk in iter(lambda: list(itertools.islice(expenses, FETCH_SIZE)), []):
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+def export_to_csv(expenses, filename="expenses.csv", compress=None):
+    """Export expenses (a list or any iterable) to a CSV file, streaming the rows. Returns the number of rows exported.
+
+    The file is gzip-compressed if `compress` is set, or by default when the name ends in .gz.
+    """
+    return _export(expenses, filename, lambda rows, name: _write_csv(rows, name, compress), "export_to_csv")
+
+def _write_jsonl(expenses, filename, compress=None):
+    """Write the expenses as JSON Lines. Returns the number of rows."""
+    count = 0
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    with _open_text(filename, compress) as file:
+        for chunk in iter(lambda: list(itertools.islice(expenses, FETCH_SIZE)), []):
+            file.write("".join(
+                encode({"id": exp[0], "date": exp[1], "category": exp[2], "amount": exp[3], "note": exp[4]}) + "\n"
+                for exp in chunk
+            ))
+            count += len(chunk)
+    return count
+
+def export_to_jsonl(expenses, filename="expenses.jsonl", compress=None):
+    """Export expenses to a JSON Lines file (one object per line), gzip-compressed like export_to_csv."""
+    return _export(expenses, filename, lambda rows, name: _write_jsonl(rows, name, compress), "export_to_jsonl")
+
+# Binary snapshot: a header, then each column as a contiguous little-endian array, so a reader
+# can memory-map the file and use the columns in place (see analytics.ExpenseFrame.from_snapshot).
+# Header: SNAPSHOT_MAGIC, row count (uint64), number of categories (uint32), then each category
+# name as a uint16 length and UTF-8 bytes, zero-padded to a multiple of 8 bytes. The columns
+# are in SNAPSHOT_COLUMNS order: ids, amounts in cents, days since 1970-01-01 and category
+# codes (indexes into the category names).
+SNAPSHOT_MAGIC = b"EXPSNAP1"
+SNAPSHOT_COLUMNS = (("ids", "q", "<i8"), ("cents", "q", "<i8"), ("days", "i", "<i4"), ("categories", "B", "u1"))
+EPOCH_ORDINAL = Date(1970, 1, 1).toordinal()
+
+def _write_snapshot(expenses, filename):
+    """Write the expenses as a binary snapshot. Returns the number of rows."""
+    # Columns are spooled to temporary files while streaming, since the header needs the row count.
+    directory = os.path.dirname(os.path.abspath(filename))
+    spools = [tempfile.TemporaryFile(dir=directory) for _ in SNAPSHOT_COLUMNS]
+    try:
+        codes = {}
+        days = {}
+        count = 0
+        for chunk in iter(lambda: list(itertools.islice(expenses, FETCH_SIZE)), []):
+            columns = [array.array(typecode) for _, typecode, _ in SNAPSHOT_COLUMNS]
+            for exp in chunk:
+                day = days.get(exp[1])
+                if day is None:
+                    day = days[exp[1]] = Date.fromisoformat(exp[1]).toordinal() - EPOCH_ORDINAL
+                code = codes.get(exp[2])
+                if code is None:
+                    if len(codes) == 256:
+                        raise ValueError("snapshots support at most 256 categories")
+                    code = codes[exp[2]] = len(codes)
+                columns[0].append(exp[0])
+                columns[1].append(round(exp[3] * 100))
+                columns[2].append(day)
+                columns[3].append(code)
+            for column, spool in zip(columns, spools):
+                if sys.byteorder == "big":
+                    column.byteswap()
+                column.tofile(spool)
+            count += len(chunk)
+        
+        header = bytearray(SNAPSHOT_MAGIC + struct.pack("<QI", count, len(codes)))
+        for name in codes:
+            encoded = name.encode("utf-8")
+            header += struct.pack("<H", len(encoded)) + encoded
+        header += bytes(-len(header) % 8)
+        with open(filename, mode="wb") as file:
+            file.write(header)
+            for spool in spools:
+                spool.seek(0)
+                shutil.copyfileobj(spool, file, 1024 * 1024)
+        return count
+    finally:
+        for spool in spools:
+            spool.close()
+
+def export_to_snapshot(expenses, filename="expenses.snap"):
+    """Export expenses to a columnar binary snapshot (notes are not included)."""
+    return _export(expenses, filename, _write_snapshot, "export_to_snapshot")
+
+def read_snapshot_header(buffer):
+    """Parse a snapshot header. Returns (row count, category names, {column: (offset, dtype)})."""
+    if bytes(buffer[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+        raise ValueError("not an expense snapshot")
+    position = len(SNAPSHOT_MAGIC)
+    count, category_count = struct.unpack_from("<QI", buffer, position)
+    position += struct.calcsize("<QI")
+    names = []
+    for _ in range(category_count):
+        (length,) = struct.unpack_from("<H", buffer, position)
+        names.append(bytes(buffer[position + 2:position + 2 + length]).decode("utf-8"))
+        position += 2 + length
+    position += -position % 8
+    
+    columns = {}
+    for name, typecode, dtype in SNAPSHOT_COLUMNS:
+        columns[name] = (position, dtype)
+        position += count * array.array(typecode).itemsize
+    if position > len(buffer):
+        raise ValueError("truncated expense snapshot")
+    return count, names, columns
+
+# Export formats by name, for export_expenses. The format can also be inferred from the file name.
+EXPORT_FORMATS = {
+    "csv": export_to_csv,
+    "csv.gz": lambda expenses, filename: export_to_csv(expenses, filename, compress=True),
+    "jsonl": export_to_jsonl,
+    "jsonl.gz": lambda expenses, filename: export_to_jsonl(expenses, filename, compress=True),
+    "snapshot": export_to_snapshot,
+}
+
+def export_format(filename):
+    """Return the export format matching a file name (CSV unless the extension says otherwise)."""
+    for extension, name in ((".csv.gz", "csv.gz"), (".jsonl.gz", "jsonl.gz"), (".jsonl", "jsonl"), (".snap", "snapshot")):
+        if filename.endswith(extension):
+            return name
+    return "csv"
+
+def export_expenses(expenses, filename, file_format=None):
+    """Export expenses in the given format, or the one inferred from the file name. Returns the number of rows exported."""
+    return EXPORT_FORMATS[file_format or export_format(filename)](expenses, filename)
+
+def _write_partition(filename, chunks, compress):
+    """Write the chunks of rows taken from a queue to one CSV file, until None is received."""
+    count = 0
+    with _open_text(filename, compress) as file:
+        writer = csv.writer(file)
+        writer.writerow(["ID", "Date", "Category", "Amount", "Note"])
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return count
+            writer.writerows(chunk)
+            count += len(chunk)
+
+def _send_chunk(chunks, chunk, future):
+    """Queue a chunk for a partition writer, raising its error if the writer failed."""
+    while True:
+        try:
+            chunks.put(chunk, timeout=0.1)
+            return
+        except queue.Full:
+            if future.done():
+                future.result()
+                raise RuntimeError("partition writer stopped early")
+
+def export_partitioned(expenses, partition, directory=".", compress=False, workers=EXPORT_WORKERS):
+    """Export expenses grouped by partition ("category" or "month") to one CSV file per partition.
+
+    The rows must arrive grouped by partition (ExpenseDB.iter_expenses_partitioned), so the table is
+    read once. Each file is written, and optionally gzip-compressed, by a worker thread while the
+    next partitions are read. Returns {filename: rows exported}, or None on error.
+    """
+    key = PARTITION_KEYS[partition]
+    extension = ".csv.gz" if compress else ".csv"
+    written = {}
+    pending = []
+    open_chunks = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as executor:
+            try:
+                for value, rows in itertools.groupby(expenses, key):
+                    # At most `workers` files are open: wait for the oldest before starting another.
+                    if len(pending) >= workers:
+                        filename, future = pending.pop(0)
+                        written[filename] = future.result()
+                    
+                    filename = os.path.join(directory, f"expenses_{value}{extension}")
+                    open_chunks = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+                    future = executor.submit(_write_partition, filename, open_chunks, compress)
+                    pending.append((filename, future))
+                    while True:
+                        chunk = list(itertools.islice(rows, FETCH_SIZE))
+                        if not chunk:
+                            break
+                        _send_chunk(open_chunks, chunk, future)
+                    _send_chunk(open_chunks, None, future)
+                    open_chunks = None
+            finally:
+                if open_chunks is not None:
+                    # The scan failed: let the writer of the current file finish.
+                    _send_chunk(open_chunks, None, pending[-1][1])
+                for filename, future in pending:
+                    written[filename] = future.result()
+    
+    except Exception as e:
+        print(f"Error exporting expenses: {e}")
+        logger.error("Error in export_partitioned: %s: %s", directory, e)
+        return None
+    
+    if not written:
+        print("No expense to export.")
+        logger.warning("Attempt to export expenses. No data available.")
+        return written
+    
+    print(f"{sum(written.values())} expenses exported to {len(written)} files in {directory}.")
+    logger.info("%s expenses exported by %s to %s files in %s", sum(written.values()), partition, len(written), directory)
+    return written
 
 def print_report_category(report_data):
     """Display the expense report grouped by cateogry."""
@@ -61,4 +322,150 @@ def print_report_date_range(report_data, start, end):
     print(f"Total spent:      {total:.2f}")
     print(f"Number of expenses:   {count}")
     print(f"Average per expense: {avg:.2f}")
-           
+
+def print_report_trend(report_data, period):
+    """Display a trend report: total, count and running total per period (and category)."""
+    if not report_data:
+        print("No expenses available to display in the report.")
+        return
+    
+    print(f"\nTrend report by {period}:")
+    print("-" * 70)
+    print(f"{'Period':<12} {'Category':<15} {'Total':>12} {'Count':>8} {'Running total':>16}")
+    print("-" * 70)
+    
+    for period_start, category, total, count, running_total in report_data:
+        print(f"{period_start:<12} {category or 'All':<15} {total:>12.2f} {count:>8} {running_total:>16.2f}")
+
+def read_csv_rows(filename):
+    """Yield the rows of a CSV file one at a time, skipping the header if present."""
+    with open(filename, mode="r", newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        for line_number, row in enumerate(reader, start=1):
+            if line_number == 1 and row and row[0].strip().lower() in ("id", "date"):
+                continue
+            yield line_number, row
+
+def parse_csv_row(row):
+    """Parse a CSV row into a (date, category, amount, note) tuple. Returns (expense, None) or (None, reason)."""
+    if len(row) == 5:
+        row = row[1:]
+    if len(row) == 3:
+        row = row + [""]
+    if len(row) != 4:
+        return None, f"expected 4 or 5 columns, got {len(row)}"
+    
+    date, category, amount, note = (field.strip() for field in row)
+    
+    try:
+        if len(date) != 10 or date[4] != "-" or date[7] != "-":
+            raise ValueError
+        Date.fromisoformat(date)
+    except ValueError:
+        return None, f"invalid date: {date}"
+    
+    if category not in CATEGORY_SET:
+        return None, f"unknown category: {category}"
+    
+    try:
+        amount = float(amount)
+    except ValueError:
+        return None, f"invalid amount: {amount}"
+    if not math.isfinite(amount):
+        return None, f"invalid amount: {amount}"
+    if amount < 0:
+        return None, f"negative amount: {amount}"
+    
+    return (date, category, amount, note), None
+
+def import_from_csv(db, filename, reject_filename=None, batch_size=BATCH_SIZE, progress_every=PROGRESS_EVERY,
+                    on_duplicate="insert"):
+    """Import expenses from a CSV file in batches. Invalid rows are written to a reject file.
+    
+    on_duplicate ("insert", "skip" or "update") is passed to ExpenseDB.add_expenses_many, so re-importing
+    an overlapping file does not add the same expenses twice.
+    """
+    if not os.path.exists(filename):
+        print(f"File not found: {filename}")
+        logger.warning("Attempt to import expenses. File not found: %s", filename)
+        return None
+    
+    if reject_filename is None:
+        reject_filename = f"{os.path.splitext(filename)[0]}_rejected.csv"
+    
+    counts = {"read": 0, "rejected": 0}
+    reject_file = None
+    reject_writer = None
+    
+    def valid_rows():
+        nonlocal reject_file, reject_writer
+        for line_number, row in read_csv_rows(filename):
+            counts["read"] += 1
+            if counts["read"] % progress_every == 0:
+                print(f"{counts['read']} rows processed...")
+            
+            expense, reason = parse_csv_row(row)
+            if expense is None:
+                if reject_writer is None:
+                    reject_file = open(reject_filename, mode="w", newline="", encoding="utf-8")
+                    reject_writer = csv.writer(reject_file)
+                    reject_writer.writerow(["Line", "Reason", "Row"])
+                reject_writer.writerow([line_number, reason, *row])
+                counts["rejected"] += 1
+                continue
+            yield expense
+    
+    try:
+        summary = db.add_expenses_many(valid_rows(), batch_size=batch_size, on_duplicate=on_duplicate)
+    except Exception as e:
+        print(f"Error importing expenses: {e}")
+        logger.error("Error in import_from_csv: %s: %s", filename, e)
+        return None
+    finally:
+        if reject_file is not None:
+            reject_file.close()
+    
+    if summary["error"] is not None:
+        print(f"Import stopped after {counts['read']} rows read and {summary['inserted']} inserted: {summary['error']}")
+        logger.error("Import from %s stopped after %s inserted: %s", filename, summary["inserted"], summary["error"])
+        return None
+    
+    summary = {
+        "read": counts["read"],
+        "inserted": summary["inserted"],
+        "duplicates": summary["duplicates"],
+        "rejected": counts["rejected"] + summary["rejected"],
+    }
+    print(f"Import finished: {summary['read']} rows read, {summary['inserted']} inserted, "
+          f"{summary['duplicates']} duplicates, {summary['rejected']} rejected.")
+    if counts["rejected"]:
+        print(f"Rejected rows saved in: {reject_filename}.")
+    logger.info("Import from %s: read=%s, inserted=%s, duplicates=%s, rejected=%s", filename, summary['read'],
+                summary['inserted'], summary['duplicates'], summary['rejected'])
+    return summary
+
+def print_metrics(stats):
+    """Display the performance statistics collected by metrics.py."""
+    if not stats:
+        print("No performance statistics recorded.")
+        return
+    
+    print(f"\n{'Name':<60} {'Calls':>7} {'Rows':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Max ms':>9}")
+    print("-" * 117)
+    for name, stat in stats.items():
+        print(f"{name[:60]:<60} {stat['calls']:>7} {stat['rows']:>9} {stat['p50_ms']:>9.3f} "
+              f"{stat['p95_ms']:>9.3f} {stat['p99_ms']:>9.3f} {stat['max_ms']:>9.3f}")
+
+def print_cache_stats(stats):
+    """Display the query result cache statistics."""
+    if stats is None:
+        print("The query cache is disabled.")
+        return
+    
+    print("\nQuery cache:")
+    print("-" * 40)
+    print(f"Hits / misses:     {stats['hits']} / {stats['misses']} ({stats['hit_rate']:.1%} hit rate)")
+    print(f"Entries:           {stats['entries']}")
+    print(f"Memory:            {stats['bytes'] / 1024 / 1024:.1f} of {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+    print(f"Invalidations:     {stats['invalidations']}")
+    print(f"Evictions:         {stats['evictions']}")